@@ -15,11 +15,35 @@ Functions
 
 - save : store nested dictionary in hdf5 file
 - load : load nested dictionary from hdf5 file
+- iterload : iterate over blocks of a dataset in hdf5 file
+- dumps : store nested dictionary in hdf5 file in memory
+- loads : load nested dictionary from hdf5 file in memory
+- merge_virtual : merge hdf5 files into one file without copying data
+- save_sharded : store nested dictionary in multiple hdf5 files
+
+Classes
+-------
+
+- SWMRWriter : append to datasets while the file is read by others
+- SWMRReader : read a file while it is written by a SWMRWriter
+- BufferedWriter : store many dictionaries in a file built in memory
+- RawArray : numpy array returned by load in raw mode
+- BlockStream : blocks of an array written one by one by save
 
 """
 
 from .wrapper import save
 from .wrapper import load
+from .wrapper import iterload
+from .wrapper import dumps
+from .wrapper import loads
+from .wrapper import RawArray
+from .wrapper import BlockStream
+from .virtual import merge_virtual
+from .shards import save_sharded
+from .swmr import SWMRWriter
+from .swmr import SWMRReader
+from .buffered import BufferedWriter
 
 
 __version__ = '1.1.0'
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Buffered writing of hdf5 files in memory
+
+A BufferedWriter builds an hdf5 file in memory with any number of saves
+and writes it to disk in a single sequential write on closing, avoiding
+the many small writes of individual saves, e.g. on network file systems.
+"""
+
+from . import wrapper
+
+
+class BufferedWriter(object):
+    """
+    Stores dictionaries in an hdf5 file held in memory, which is written
+    to disk when the writer is closed.
+
+    An existing file is read once on construction. On closing, the file is
+    written to a temporary file in the same directory which then replaces
+    filename. If the writer is used as a context manager and an exception
+    is raised, nothing is written and filename is left unchanged.
+
+    Parameters
+    ----------
+    filename : string
+        The file name of the hdf5 file.
+    write_mode : {'a', 'w'}, optional
+        Analog to normal file handling in python. Defaults to 'a'.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> import h5py_wrapper as h5w
+    >>> with h5w.BufferedWriter('example_buffered.h5') as w:
+    ...     for i in range(100):
+    ...         w.save({'trial{}'.format(i): np.random.rand(10)},
+    ...                overwrite_dataset=True)
+    """
+
+    def __init__(self, filename, write_mode='a'):
+        self.filename = filename
+        try:
+            self._file = wrapper._open_buffered(filename, write_mode)
+        except IOError:
+            raise IOError("unable to create {filename} (File "
+                          "accessability: Unable to open "
+                          "file)".format(filename=filename))
+
+    def save(self, d, overwrite_dataset=False, path=None, compression=None,
+             dedup=False, incremental=False, prune=False, num_threads=1,
+             precision=None):
+        """
+        Stores the dictionary d in the file held in memory. The arguments
+        are the same as for save.
+        """
+        wrapper._save_to_file(self._file, d, overwrite_dataset, path=path,
+                              compression=compression, dedup=dedup,
+                              incremental=incremental, prune=prune,
+                              num_threads=num_threads, precision=precision)
+
+    def close(self):
+        """
+        Writes the file to disk and closes it.
+        """
+        wrapper._write_buffered(self._file, self.filename)
+
+    def discard(self):
+        """
+        Closes the file without writing it to disk.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
@@ -0,0 +1,200 @@
+# encoding: utf8
+"""
+Parallel compression and decompression of chunked datasets.
+
+Chunks are compressed in a thread pool (zlib releases the GIL) and
+written to the hdf5 file with direct chunk writes, bypassing the
+filter pipeline of HDF5. The resulting datasets use the standard gzip
+filter and can be read by any hdf5 library. Likewise, gzip compressed
+datasets are read as raw chunks which are decompressed in a thread pool.
+
+"""
+
+import collections
+import itertools
+import numpy as np
+import zlib
+
+# default gzip compression level of h5py
+DEFAULT_GZIP_LEVEL = 4
+
+
+def gzip_level(compression):
+    """
+    Returns the gzip compression level corresponding to the compression
+    argument of save, or None if compression does not use gzip.
+    """
+    if compression == 'gzip':
+        return DEFAULT_GZIP_LEVEL
+    if (isinstance(compression, int) and not isinstance(compression, bool) and
+            0 <= compression <= 9):
+        return compression
+    return None
+
+
+def supports_parallel_write(data, compression):
+    """
+    Checks whether data can be written with parallel compression.
+    """
+    return (gzip_level(compression) is not None and
+            isinstance(data, np.ndarray) and data.ndim > 0 and data.size > 0 and
+            data.dtype.kind in 'biufc')
+
+
+def chunk_offsets(shape, chunk_shape):
+    """
+    Returns the offsets of all chunks of a dataset in C order.
+    """
+    return list(itertools.product(*[range(0, n, c)
+                                    for n, c in zip(shape, chunk_shape)]))
+
+
+def chunk_slice(offset, chunk_shape):
+    """
+    Returns the slice selecting the chunk at offset.
+    """
+    return tuple(slice(o, o + c) for o, c in zip(offset, chunk_shape))
+
+
+def create_compressed_dataset(parent_group, name, data, compression,
+                              num_threads):
+    """
+    Creates a gzip compressed dataset containing the array data in
+    parent_group, compressing its chunks with num_threads threads.
+    """
+    level = gzip_level(compression)
+    dataset = parent_group.create_dataset(name, shape=data.shape,
+                                          dtype=data.dtype, chunks=True,
+                                          compression='gzip',
+                                          compression_opts=level)
+    chunk_shape = dataset.chunks
+
+    def compress(offset):
+        block = data[chunk_slice(offset, chunk_shape)]
+        if block.shape != chunk_shape:
+            # chunks at the edges are stored with the full chunk shape
+            padded = np.zeros(chunk_shape, dtype=data.dtype)
+            padded[tuple(slice(0, n) for n in block.shape)] = block
+            block = padded
+        return zlib.compress(np.ascontiguousarray(block), level)
+
+    # imported on first use, since it dominates the import time
+    from multiprocessing.pool import ThreadPool
+    offsets = chunk_offsets(data.shape, chunk_shape)
+    pool = ThreadPool(num_threads)
+    try:
+        for offset, chunk in zip(offsets, pool.imap(compress, offsets)):
+            dataset.id.write_direct_chunk(offset, chunk)
+    finally:
+        pool.close()
+        pool.join()
+    return dataset
+
+
+def supports_parallel_read(dataset):
+    """
+    Checks whether dataset can be read with parallel decompression, i.e.,
+    whether it is a numeric, chunked dataset using only the gzip filter.
+    """
+    return (dataset.chunks is not None and dataset.compression == 'gzip' and
+            not dataset.shuffle and not dataset.fletcher32 and
+            dataset.scaleoffset is None and dataset.size > 0 and
+            dataset.dtype.kind in 'biufc')
+
+
+def read_compressed_dataset(dataset, num_threads, out=None):
+    """
+    Reads the gzip compressed dataset, decompressing its chunks with
+    num_threads threads. If given, the data is written to the array out.
+    """
+    if out is None:
+        out = np.empty(dataset.shape, dtype=dataset.dtype)
+    from multiprocessing.pool import ThreadPool
+    offsets = chunk_offsets(dataset.shape, dataset.chunks)
+    pool = ThreadPool(num_threads)
+    try:
+        for result in _submit_chunks(dataset, offsets, out,
+                                     (0,) * dataset.ndim, pool):
+            result.get()
+    finally:
+        pool.close()
+        pool.join()
+    return out
+
+
+def iter_blocks(dataset, num_threads=1, readahead=1):
+    """
+    Iterates over blocks of dataset along its first axis, each spanning
+    one chunk along the first axis. While a block is processed by the
+    caller, the following readahead blocks are already read and
+    decompressed with num_threads threads.
+    """
+    if dataset.chunks is None or not supports_parallel_read(dataset):
+        step = dataset.shape[0] if dataset.chunks is None else dataset.chunks[0]
+        for start in range(0, dataset.shape[0], max(step, 1)):
+            yield dataset[start:start + step]
+        return
+
+    chunk_shape = dataset.chunks
+    rows = iter(range(0, dataset.shape[0], chunk_shape[0]))
+    pending = collections.deque()
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(num_threads)
+
+    def submit(start):
+        stop = min(start + chunk_shape[0], dataset.shape[0])
+        out = np.empty((stop - start,) + dataset.shape[1:], dtype=dataset.dtype)
+        origin = (start,) + (0,) * (dataset.ndim - 1)
+        offsets = [(start,) + offset[1:] for offset in
+                   chunk_offsets(out.shape, chunk_shape)]
+        pending.append((out, _submit_chunks(dataset, offsets, out, origin,
+                                            pool)))
+
+    try:
+        for start in itertools.islice(rows, readahead + 1):
+            submit(start)
+        while pending:
+            out, results = pending.popleft()
+            for result in results:
+                result.get()
+            for start in itertools.islice(rows, 1):
+                submit(start)
+            yield out
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _submit_chunks(dataset, offsets, out, origin, pool):
+    """
+    Reads the raw chunks of dataset at offsets and submits their
+    decompression into out, whose first element corresponds to the
+    element origin of the dataset, to the thread pool. Returns the list
+    of pending results.
+
+    All hdf5 calls are made from the calling thread, since h5py
+    serializes them with a global lock which may be held by the caller.
+    """
+    results = []
+    for offset in offsets:
+        target = out[tuple(slice(o - p, min(o - p + c, n))
+                           for o, p, c, n in zip(offset, origin,
+                                                 dataset.chunks, out.shape))]
+        try:
+            filter_mask, chunk = dataset.id.read_direct_chunk(offset)
+        except RuntimeError:  # chunk has never been written
+            target[...] = dataset.fillvalue
+            continue
+        results.append(pool.apply_async(
+            _decompress_chunk, (chunk, filter_mask, dataset.chunks, target)))
+    return results
+
+
+def _decompress_chunk(chunk, filter_mask, chunk_shape, target):
+    """
+    Decompresses the raw chunk and copies its contents into target.
+    """
+    if not filter_mask & 1:  # gzip filter has been applied to chunk
+        chunk = zlib.decompress(chunk)
+    block = np.frombuffer(chunk, dtype=target.dtype).reshape(chunk_shape)
+    target[...] = block[tuple(slice(0, n) for n in target.shape)]
@@ -4,10 +4,10 @@ Collection of convenience functions.
 
 """
 
+import h5py
+import hashlib
 import numpy as np
 import os
-import requests
-import tarfile
 
 
 def get_previous_version(version, path):
@@ -27,6 +27,10 @@ def get_previous_version(version, path):
     package_dir : str
         Path to package.
     """
+    # imported here since they are only needed for the conversion script
+    import requests
+    import tarfile
+
     base_url = "https://github.com/INM-6/h5py_wrapper/archive/"
     if version == '0.0.1':
         ver = 'v0.0.1'
@@ -85,13 +89,56 @@ def convert_numpy_types_in_dict(d):
 
 def convert_iterable_to_numpy_array(it):
     """
-    Converts an iterable to a numpy array. If the elements of the
-    iterable are strings, numpy unicode types are avoided by changing
-    dtype to np.string_ to ensure h5py compatibility. See
+    Converts an iterable to a numpy array. Numpy arrays are returned
+    without copying. If the elements of the iterable are strings, numpy
+    unicode types are avoided by encoding them as UTF-8 byte strings to
+    ensure h5py compatibility. See
     http://docs.h5py.org/en/latest/strings.html#what-about-numpy-s-u-type.
     """
-    array = np.array(it)
+    array = np.asarray(it)
     if array.dtype.kind == 'U':
-        return array.astype(np.string_)
+        return encode_unicode_array(array)
     else:
         return array
+
+
+def encode_unicode_array(array):
+    """
+    Encodes a numpy unicode array as UTF-8 byte strings, which are marked
+    as UTF-8 for h5py if supported (h5py >= 2.10).
+    """
+    try:
+        encoded = array.astype(np.string_)  # fast path for ASCII strings
+    except UnicodeEncodeError:
+        encoded = np.char.encode(array, 'utf-8')
+    if hasattr(h5py, 'string_dtype'):
+        encoded = encoded.view(h5py.string_dtype('utf-8',
+                                                 encoded.dtype.itemsize))
+    return encoded
+
+
+def decode_bytes_array(array):
+    """
+    Decodes a numpy array of UTF-8 encoded byte strings to a numpy
+    unicode array.
+    """
+    try:
+        return array.astype(np.unicode_)  # fast path for ASCII strings
+    except UnicodeDecodeError:
+        return np.char.decode(array, 'utf-8')
+
+
+def hash_array(array):
+    """
+    Returns a hex digest identifying the contents, data type and shape
+    of a numpy array.
+    """
+    # ascontiguousarray turns 0-d arrays into 1-d arrays, so the shape
+    # is taken from the original array
+    shape = np.shape(array)
+    array = np.ascontiguousarray(array)
+    h = hashlib.sha1()
+    h.update(array.dtype.str.encode('utf-8'))
+    h.update(str(shape).encode('utf-8'))
+    h.update(array.view(np.uint8))
+    return h.hexdigest()
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Sharding of large dictionaries across multiple hdf5 files
+
+The top-level values of a dictionary are distributed over several shard
+files, which can be written in parallel. A small index file contains
+external links to all values, so it can be loaded with load like a
+single file, opening only the shards that are accessed.
+"""
+
+import h5py
+import numpy as np
+import os
+
+from . import wrapper
+
+
+def save_sharded(filename, d, num_shards=None, shard_size=None, processes=1,
+                 **kwargs):
+    """
+    Saves a dictionary to an index file and multiple shard files.
+
+    Each top-level value of the dictionary is stored in one of the shard
+    files, named like the index file with the number of the shard
+    inserted before the extension, e.g. data.0.h5, data.1.h5, ... for
+    data.h5. The index file contains external links to all values, hence
+    the dictionary is loaded from the index file with load. Existing
+    values can be overwritten, updated incrementally or pruned through
+    the index file with save, which writes to or deletes from the linked
+    shards. Values that are already stored in a shard are written to the
+    same shard again. New top-level keys have to be added with
+    save_sharded, since save stores them in the index file itself.
+
+    Parameters
+    ----------
+    filename : string
+        The file name of the index file.
+    d : dict
+        The dictionary to be stored.
+    num_shards : int, optional
+        Number of shard files. Values are distributed such that the
+        shards are of similar size. Either num_shards or shard_size has to
+        be given.
+    shard_size : int, optional
+        Maximal size of a shard file in bytes. Values are added to a shard
+        until its size would exceed shard_size, values larger than
+        shard_size are stored in a shard of their own. Either num_shards
+        or shard_size has to be given.
+    processes : int, optional
+        Number of processes writing shard files in parallel. The processes
+        are forked and inherit the dictionary, so no data is copied
+        between processes. On platforms that cannot fork, shards are
+        written sequentially. Defaults to 1.
+    **kwargs
+        Keyword arguments passed to save for every shard, e.g. write_mode,
+        compression or overwrite_dataset. The argument path is not
+        supported.
+
+    Returns
+    -------
+    None
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> import h5py_wrapper as h5w
+    >>> d = {'trial{}'.format(i): np.random.rand(1000) for i in range(10)}
+    >>> h5w.save_sharded('example_sharded.h5', d, num_shards=4,
+    ...                  processes=4, write_mode='w')
+    >>> d = h5w.load('example_sharded.h5')
+    """
+    if (num_shards is None) == (shard_size is None):
+        raise ValueError("Exactly one of num_shards and shard_size "
+                         "must be defined.")
+    if kwargs.get('path') or kwargs.get('dict_label'):
+        raise ValueError("path is not supported for sharded files.")
+    write_mode = kwargs.get('write_mode', 'a')
+    base, ext = os.path.splitext(filename)
+    shard_names = [_shard_name(base, i, ext) for i in range(num_shards or 0)]
+    exists = os.path.exists(filename)
+    if exists and write_mode in ('w-', 'x'):
+        raise IOError("unable to create {filename} (File "
+                      "accessability: Unable to open "
+                      "file)".format(filename=filename))
+    linked = {}
+    if exists and write_mode != 'w':
+        try:
+            index = h5py.File(filename, 'r')
+        except IOError:
+            raise IOError("unable to open {filename} (File accessability: "
+                          "Unable to open file)".format(filename=filename))
+        try:
+            linked = _linked_shards(index, filename)
+        finally:
+            index.close()
+    shards = _assign_shards(d, linked, shard_names, shard_size, base, ext,
+                            truncate=write_mode == 'w')
+
+    # shards are written before the index file is opened, so no hdf5 file
+    # is open when worker processes are forked
+    jobs = [(shard_name, keys, kwargs) for shard_name, keys in shards.items()]
+    global _shared_dict
+    _shared_dict = d
+    try:
+        if processes > 1 and len(jobs) > 1 and hasattr(os, 'fork'):
+            pool = _fork_context().Pool(min(processes, len(jobs)))
+            try:
+                pool.map(_save_shard, jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for job in jobs:
+                _save_shard(job)
+    finally:
+        _shared_dict = None
+
+    try:
+        index = h5py.File(filename, write_mode)
+    except IOError:
+        raise IOError("unable to create {filename} (File "
+                      "accessability: Unable to open "
+                      "file)".format(filename=filename))
+    try:
+        index_dir = os.path.dirname(os.path.abspath(filename))
+        for shard_name, keys in shards.items():
+            for key in keys:
+                if str(key) in linked:
+                    continue
+                if str(key) in index:
+                    if not kwargs.get('overwrite_dataset', False):
+                        raise KeyError("Dataset {key} already "
+                                       "exists.".format(key='/' + str(key)))
+                    del index[str(key)]
+                index[str(key)] = h5py.ExternalLink(
+                    os.path.relpath(shard_name, index_dir), '/' + str(key))
+    finally:
+        index.close()
+
+# ______________________________________________________________________________
+# Auxiliary functions
+
+# dictionary written by save_sharded, inherited by forked worker processes
+_shared_dict = None
+
+
+def _fork_context():
+    """
+    Returns the multiprocessing context forking worker processes.
+    multiprocessing is imported on first use to keep the import time of
+    the package low.
+    """
+    import multiprocessing
+    if hasattr(multiprocessing, 'get_context'):
+        return multiprocessing.get_context('fork')
+    return multiprocessing  # python 2 always forks on posix systems
+
+
+def _shard_name(base, i, ext):
+    """
+    Returns the file name of shard i of the index file base + ext.
+    """
+    return os.path.normpath('{base}.{i}{ext}'.format(base=base, i=i, ext=ext))
+
+
+def _linked_shards(index, filename):
+    """
+    Returns the shard file names of all values linked in the index file,
+    keyed by the names of the links.
+    """
+    linked = {}
+    for name in index:
+        link = index.get(name, getlink=True)
+        if isinstance(link, h5py.ExternalLink):
+            linked[name] = os.path.normpath(os.path.join(
+                os.path.dirname(filename), link.filename))
+    return linked
+
+
+def _assign_shards(d, linked, shard_names, shard_size, base, ext,
+                   truncate=False):
+    """
+    Assigns the top-level keys of d to shard files. Keys which are already
+    linked in the index are assigned to their shard. Other keys are
+    assigned to the smallest of the shard_names if shard_size is None, or
+    to the first shard with enough space left otherwise, creating new
+    shards as needed. Existing shard files count towards the size of the
+    shards unless they are truncated. Returns the keys of every shard
+    keyed by file name.
+    """
+    shards = {name: [] for name in shard_names}
+    for name in linked.values():
+        shards.setdefault(name, [])
+    sizes = {name: os.path.getsize(name)
+             if os.path.exists(name) and not truncate else 0
+             for name in shards}
+    for key in sorted(d, key=lambda key: -_estimate_size(d[key])):
+        if str(key) in linked:
+            shards[linked[str(key)]].append(key)
+            continue
+        size = _estimate_size(d[key])
+        if shard_size is None:
+            name = min(shard_names, key=lambda name: sizes[name])
+        else:
+            candidates = [name for name in sorted(shards)
+                          if sizes[name] + size <= shard_size]
+            if candidates:
+                name = candidates[0]
+            else:
+                i = len(shards)
+                name = _shard_name(base, i, ext)
+                while name in shards or (os.path.exists(name) and
+                                         not truncate):
+                    i += 1
+                    name = _shard_name(base, i, ext)
+                shards[name] = []
+                sizes[name] = 0
+        shards[name].append(key)
+        sizes[name] += size
+    return {name: keys for name, keys in shards.items() if keys}
+
+
+def _estimate_size(value):
+    """
+    Returns an estimate of the size of value in bytes.
+    """
+    if isinstance(value, dict):
+        return sum(_estimate_size(v) for v in value.values())
+    try:
+        return np.asarray(value).nbytes
+    except (TypeError, ValueError):
+        return 0
+
+
+def _save_shard(job):
+    """
+    Saves the values of the dictionary written by save_sharded stored
+    under keys to the shard file shard_name.
+    """
+    shard_name, keys, kwargs = job
+    wrapper.save(shard_name, {key: _shared_dict[key] for key in keys},
+                 **kwargs)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Single-writer/multiple-reader (SWMR) access to hdf5 files
+
+A single SWMRWriter appends rows to the datasets of a file while any
+number of SWMRReaders, e.g. in other processes, read the data written so
+far without copying or locking the file.
+"""
+
+import h5py
+import numpy as np
+
+from . import wrapper
+
+
+class SWMRWriter(object):
+    """
+    Writes a dictionary to an hdf5 file and appends rows to its arrays
+    in single-writer/multiple-reader mode.
+
+    All groups and datasets have to be created before readers can access
+    the file, hence the structure of the file is defined by the
+    dictionary passed on construction. Arrays in this dictionary are
+    stored in datasets that can be extended along their first axis.
+
+    Parameters
+    ----------
+    filename : string
+        The file name of the hdf5 file.
+    d : dict
+        The dictionary defining the initial content of the file.
+    write_mode : {'a', 'w'}, optional
+        Analog to normal file handling in python. Defaults to 'w'.
+    compression : {'gzip', 'szip','lzf', 0,...,10}, optional
+        Compression strategy to reduce file size, see save.
+        Defaults to None.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> import h5py_wrapper as h5w
+    >>> with h5w.SWMRWriter('example_swmr.h5', {'rates': np.empty(0)}) as w:
+    ...     for i in range(10):
+    ...         w.append('rates', np.random.rand(100))
+    ...         w.flush()
+    """
+
+    def __init__(self, filename, d, write_mode='w', compression=None):
+        try:
+            self._file = h5py.File(filename, write_mode, libver='latest')
+        except IOError:
+            raise IOError("unable to create {filename} (File "
+                          "accessability: Unable to open "
+                          "file)".format(filename=filename))
+        try:
+            wrapper._dict_to_h5(self._file, d, False, compression=compression,
+                                extendable=True)
+            self._file.swmr_mode = True
+        except Exception:
+            self._file.close()
+            raise
+
+    def append(self, path, rows):
+        """
+        Appends rows to the dataset at path along its first axis.
+        A single row, i.e., an array with one dimension less than the
+        dataset, is appended as one row.
+        """
+        dataset = self._file[path]
+        rows = np.asarray(rows)
+        if rows.ndim == dataset.ndim - 1:
+            rows = rows[np.newaxis]
+        n = dataset.shape[0]
+        dataset.resize(n + len(rows), axis=0)
+        dataset[n:] = rows
+
+    def flush(self):
+        """
+        Flushes all appended rows to the file, making them visible
+        to readers.
+        """
+        self._file.flush()
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SWMRReader(object):
+    """
+    Reads an hdf5 file while it is written by a SWMRWriter.
+
+    Parameters
+    ----------
+    filename : string
+        The file name of the hdf5 file.
+
+    Examples
+    --------
+    >>> import h5py_wrapper as h5w
+    >>> with h5w.SWMRReader('example_swmr.h5') as r:
+    ...     new_rates = r.poll('rates')
+    """
+
+    def __init__(self, filename):
+        try:
+            self._file = h5py.File(filename, 'r', libver='latest', swmr=True)
+        except IOError:
+            raise IOError("unable to open {filename} (File accessability: "
+                          "Unable to open file)".format(filename=filename))
+        self._positions = {}
+
+    def poll(self, path):
+        """
+        Returns the rows appended to the dataset at path since the last
+        call of poll for this path, or all rows on the first call.
+        """
+        dataset = self._file[path]
+        dataset.refresh()
+        start = self._positions.get(dataset.name, 0)
+        stop = dataset.shape[0]
+        self._positions[dataset.name] = stop
+        return wrapper._cast_value_type(dataset[start:stop], 'ndarray')
+
+    def load(self, path='', **kwargs):
+        """
+        Loads the current state of the dictionary under path.
+        Keyword arguments are passed to the loader, see load.
+        """
+        obj = self._file[path] if path else self._file
+        if isinstance(obj, h5py.Dataset):
+            obj.refresh()
+        else:
+            obj.visititems(_refresh)
+        _, d = wrapper._dict_from_h5(obj, **kwargs)
+        return d
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _refresh(name, obj):
+    """
+    Refreshes the metadata of obj if it is a dataset.
+    """
+    if isinstance(obj, h5py.Dataset):
+        obj.refresh()
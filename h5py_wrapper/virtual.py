@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Merging of hdf5 files into a single virtual view
+"""
+
+import collections
+import h5py
+import os
+
+from . import wrapper
+
+# value types of datasets that can be concatenated along their first axis
+CONCATENABLE_VALUE_TYPES = ['ndarray', 'list', 'tuple', 'Quantity']
+
+
+def merge_virtual(output, inputs):
+    """
+    Merges hdf5 files created by save into a single file without copying
+    any data. Requires h5py >= 2.9 built against HDF5 >= 1.10.
+
+    Datasets that are present in the input files with matching types
+    and shapes (except along their first axis) are concatenated along
+    their first axis into virtual datasets. All other values are stored
+    as external links to the input files and loaded as a list with one
+    value per input file containing it.
+
+    Parameters
+    ----------
+    output : string
+        The file name of the merged hdf5 file. Will be overwritten.
+    inputs : list of strings
+        File names of the hdf5 files to be merged. Stored relative to the
+        directory of output, so input files can be moved together with
+        the merged file.
+
+    Returns
+    -------
+    None
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> import h5py_wrapper as h5w
+    >>> for rank in range(2):
+    ...     h5w.save('example_rank{}.h5'.format(rank),
+    ...              {'spikes': np.arange(3) + rank, 'rank': rank},
+    ...              write_mode='w')
+    >>> h5w.merge_virtual('example_merged.h5',
+    ...                   ['example_rank0.h5', 'example_rank1.h5'])
+    >>> h5w.load('example_merged.h5')
+    {'spikes': array([0, 1, 2, 1, 2, 3]), 'rank': [0, 1]}
+    """
+    wrapper._require_h5py((2, 9), 'virtual datasets')
+    if h5py.version.hdf5_version_tuple[:2] < (1, 10):
+        raise ImportError("Using HDF5 version {version}. Version must be "
+                          ">= 1.10 for virtual datasets.".format(
+                              version=h5py.version.hdf5_version))
+    output_dir = os.path.dirname(os.path.abspath(output))
+    files = []
+    try:
+        for filename in inputs:
+            try:
+                files.append(h5py.File(filename, 'r'))
+            except IOError:
+                raise IOError("unable to open {filename} (File "
+                              "accessability: Unable to open "
+                              "file)".format(filename=filename))
+        groups = collections.OrderedDict()
+        leaves = collections.OrderedDict()
+        for i, f in enumerate(files):
+            _collect(f, groups, leaves, i)
+
+        try:
+            out = h5py.File(output, 'w')
+        except IOError:
+            raise IOError("unable to create {filename} (File "
+                          "accessability: Unable to open "
+                          "file)".format(filename=output))
+        try:
+            for name, group in groups.items():
+                out_group = out.require_group(name)
+                if '_key_type' in group.attrs:
+                    out_group.attrs['_key_type'] = group.attrs['_key_type']
+            for name, sources in leaves.items():
+                source_names = [os.path.relpath(inputs[i], output_dir)
+                                for i, _ in sources]
+                objs = [obj for _, obj in sources]
+                if _is_concatenable(objs):
+                    _create_virtual_dataset(out, name, objs, source_names)
+                else:
+                    _create_external_links(out, name, objs, source_names)
+        finally:
+            out.close()
+    finally:
+        for f in files:
+            f.close()
+
+# ______________________________________________________________________________
+# Auxiliary functions
+
+
+def _collect(group, groups, leaves, index):
+    """
+    Recursively collects the groups of a dictionary and the values
+    stored in them, recording the index of the input file for each value.
+    """
+    for obj in group.values():
+        if obj.name == wrapper.DEDUP_POOL:
+            continue
+        if (isinstance(obj, h5py.Dataset) or
+                wrapper._get_str_attr(obj, '_layout') is not None):
+            leaves.setdefault(obj.name, []).append((index, obj))
+        else:
+            groups.setdefault(obj.name, obj)
+            _collect(obj, groups, leaves, index)
+
+
+def _is_concatenable(objs):
+    """
+    Checks whether the datasets objs can be concatenated along their
+    first axis.
+    """
+    if not all(isinstance(obj, h5py.Dataset) for obj in objs):
+        return False
+    datasets = [wrapper._resolve_dataset(obj) for obj in objs]
+    first = datasets[0]
+    value_type = wrapper._get_str_attr(objs[0], '_value_type')
+    if value_type not in CONCATENABLE_VALUE_TYPES:
+        return False
+    if first.ndim == 0 or first.dtype.kind not in 'biufcS':
+        return False
+    for obj, dataset in zip(objs, datasets):
+        if ('custom_shape' in obj.attrs or
+                wrapper._get_str_attr(obj, '_value_type') != value_type or
+                _get_unit(obj) != _get_unit(objs[0]) or
+                wrapper._get_str_attr(obj, '_dtype') !=
+                wrapper._get_str_attr(objs[0], '_dtype') or
+                dataset.dtype != first.dtype or
+                dataset.shape[1:] != first.shape[1:]):
+            return False
+    return True
+
+
+def _get_unit(obj):
+    """
+    Returns the unit of the quantity stored in obj, or None.
+    """
+    if wrapper._get_str_attr(obj, '_value_type') != 'Quantity':
+        return None
+    return wrapper._get_unit(obj)
+
+
+def _create_virtual_dataset(out, name, objs, source_names):
+    """
+    Creates a virtual dataset name in out concatenating the datasets
+    objs along their first axis.
+    """
+    datasets = [wrapper._resolve_dataset(obj) for obj in objs]
+    shape = ((sum(dataset.shape[0] for dataset in datasets),) +
+             datasets[0].shape[1:])
+    layout = h5py.VirtualLayout(shape=shape, dtype=datasets[0].dtype)
+    start = 0
+    for dataset, source_name in zip(datasets, source_names):
+        stop = start + dataset.shape[0]
+        layout[start:stop] = h5py.VirtualSource(source_name, dataset.name,
+                                                shape=dataset.shape)
+        start = stop
+    vds = out.create_virtual_dataset(name, layout)
+    for attr in ['_key_type', '_value_type', '_dtype']:
+        if attr in objs[0].attrs:
+            vds.attrs[attr] = objs[0].attrs[attr]
+    unit = _get_unit(objs[0])
+    if unit is not None:
+        vds.attrs['_unit'] = unit
+
+
+def _create_external_links(out, name, objs, source_names):
+    """
+    Creates a group name in out with external links to the values objs,
+    which is loaded as a list of these values.
+    """
+    group = out.create_group(name)
+    for i, (obj, source_name) in enumerate(zip(objs, source_names)):
+        group[str(i)] = h5py.ExternalLink(source_name, obj.name)
+    group.attrs['_key_type'] = objs[0].attrs['_key_type']
+    group.attrs['_value_type'] = 'list'
+    group.attrs['_layout'] = 'external'
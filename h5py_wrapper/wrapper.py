@@ -5,25 +5,32 @@ Core functionality
 
 import ast
 import collections
-from future.builtins import str
+import fnmatch
 import h5py
+import hashlib
+import io
 import numpy as np
 import os
+import posixpath
 import re
-from subprocess import call
+import shutil
+import sys
+import uuid
 import warnings
 
+from . import chunks
 from . import lib
 
-# deprecation warnings are printed to sys.stdout
-warnings.simplefilter('default', category=DeprecationWarning)
+if sys.version_info[0] < 3:
+    from future.builtins import str
 
-# check whether quantities is available
 try:
-    import quantities as pq
-    quantities_found = True
-except ImportError:
-    quantities_found = False
+    from collections.abc import Iterator, Mapping
+except ImportError:  # python 2
+    from collections import Iterator, Mapping
+
+# deprecation warnings are printed to sys.stdout
+warnings.simplefilter('default', category=DeprecationWarning)
 
 # make sure correct h5py version is available
 h5py_version = h5py.version.version_tuple
@@ -36,16 +43,21 @@ if h5py_version_int < 231:
 
 
 def save(filename, d, write_mode='a', overwrite_dataset=False,
-         resize=False, path=None, dict_label='', compression=None):
+         resize=False, path=None, dict_label='', compression=None,
+         dedup=False, incremental=False, prune=False, num_threads=1,
+         buffered=False, precision=None):
     """
     Save a dictionary to an hdf5 file.
 
     Parameters
     ----------
-    filename : string
-        The file name of the hdf5 file.
+    filename : string or file-like object
+        The file name of the hdf5 file, or a binary file-like object,
+        e.g. io.BytesIO, to which the hdf5 file is written. File-like
+        objects require h5py >= 2.9.
     d : dict
-        The dictionary to be stored.
+        The dictionary to be stored. Generators and BlockStreams of array
+        blocks are streamed to extendable datasets block by block.
     write_mode : {'a', 'w'}, optional
         Analog to normal file handling in python. Defaults to 'a'.
     overwrite_dataset : bool, optional
@@ -55,7 +67,8 @@ def save(filename, d, write_mode='a', overwrite_dataset=False,
         If True, the hdf5 file is resized after writing all data,
         may reduce file size. Uses h5repack (see
         https://www.hdfgroup.org/HDF5/doc/RM/Tools.html#Tools-Repack).
-        Caution: slows down writing. Defaults to False.
+        Caution: slows down writing. Ignored for file-like objects.
+        Defaults to False.
     path : string, optional
         If not empty, the dictionary is stored under the given path in the hdf5
         file, with levels separated by '/'.
@@ -66,6 +79,49 @@ def save(filename, d, write_mode='a', overwrite_dataset=False,
        See http://docs.h5py.org/en/latest/high/dataset.html for details.
        Caution: This slows down writing and loading of data.
        Attention: Will be ignored for scalar data.
+    dedup : bool, optional
+        If True, the contents of arrays are hashed and every unique array
+        is stored only once in a hidden pool group of the hdf5 file. The
+        datasets at the original paths hold references to the pooled data,
+        which are resolved transparently by load. Pooled data that is no
+        longer referenced after overwriting or pruning datasets is
+        deleted. Defaults to False.
+    incremental : bool, optional
+        If True, a content hash is stored alongside the value type of every
+        dataset and existing datasets are only rewritten if their content,
+        shape or type changed. Unchanged datasets are skipped.
+        Defaults to False.
+    prune : bool, optional
+        If True, datasets and groups in the hdf5 file that are not present
+        in the dictionary are deleted. Useful in combination with
+        incremental to keep a checkpoint in sync with the dictionary.
+        Defaults to False.
+    num_threads : int, optional
+        Number of threads used to compress arrays if gzip compression is
+        used. If larger than 1, chunks are compressed in parallel and
+        written directly to the hdf5 file. Defaults to 1.
+    buffered : bool, optional
+        If True, the file is built in memory and written to disk in a
+        single sequential write when all data has been stored, which
+        avoids many small writes, e.g. on network file systems. The data
+        is written to a temporary file in the same directory which then
+        replaces filename, so filename is left unchanged if an exception
+        is raised. An existing file is read and rewritten as a whole, so
+        use a BufferedWriter to store many dictionaries in the same file.
+        Ignored for file-like objects. Defaults to False.
+    precision : numpy.dtype, int or dict, optional
+        Lossy storage of float arrays. A float data type, e.g. 'float32'
+        or 'float16', downcasts arrays to this type, which are cast back
+        to their original data type on loading. An integer n applies the
+        scale-offset filter of HDF5, which keeps n decimal digits of every
+        value. A dictionary maps patterns of dataset paths in the hdf5
+        file, e.g. {'voltages/*': 'float32'}, to these policies, using the
+        first matching pattern. Defaults to None, i.e., lossless storage.
+
+    Lists and tuples of dictionaries sharing the same keys and value
+    types (e.g. per-trial records) are stored column-wise as a table,
+    i.e., as one group containing one dataset per key, instead of one
+    group per record.
 
     Returns
     -------
@@ -79,13 +135,21 @@ def save(filename, d, write_mode='a', overwrite_dataset=False,
     >>> import h5py_wrapper as h5w
     >>> h5w.save('example.h5', d)
     """
+    if _is_file_object(filename):
+        _require_h5py((2, 9), 'file-like objects')
+        buffered = False
+        resize = False  # h5repack requires a file on disk
     try:
-        f = h5py.File(filename, write_mode)
+        if buffered:
+            f = _open_buffered(filename, write_mode)
+        else:
+            f = h5py.File(filename, write_mode)
     except IOError:
         raise IOError("unable to create {filename} (File "
                       "accessability: Unable to open "
                       "file)".format(filename=filename))
     else:
+        completed = False
         try:
             if dict_label:
                 warnings.warn("Deprecated argument dict_label provided. "
@@ -96,33 +160,70 @@ def save(filename, d, write_mode='a', overwrite_dataset=False,
                     raise ValueError("dict_label and path must not "
                                      "be defined simultaneously.")
                 path = dict_label                
-            if path:
-                base = f.require_group(path)
-                _dict_to_h5(f, d, overwrite_dataset, parent_group=base,
-                            compression=compression)
-            else:
-                _dict_to_h5(f, d, overwrite_dataset, compression=compression)
+            _save_to_file(f, d, overwrite_dataset, path=path,
+                          compression=compression, dedup=dedup,
+                          incremental=incremental, prune=prune,
+                          num_threads=num_threads, precision=precision)
+            completed = True
         finally:  # make sure file is closed even if an exception is raised
             fname = f.filename
-            f.close()
+            if buffered and completed:
+                _write_buffered(f, filename)
+            else:
+                f.close()
             if overwrite_dataset is True and resize is True:
+                from subprocess import call
                 call(['h5repack', '-i', fname, '-o', fname + '_repack'])
                 call(['mv', fname + '_repack', fname])
 
 
-def load(filename, path='', lazy=False):
+def load(filename, path='', lazy=False, table_format='records', num_threads=1,
+         swmr=False, dask_threshold=None, out=None, raw=False):
     """
     Loads a dictionary from an hdf5 file.
 
     Parameters
     ----------
-    filename : string
-        The file name of the hdf5 file.
+    filename : string or file-like object
+        The file name of the hdf5 file, or a binary file-like object,
+        e.g. io.BytesIO, containing the hdf5 file. File-like objects
+        require h5py >= 2.9.
     path : string, optional
         If not empty, specifies a path to access deeper levels in the hdf5 file.
     lazy : boolean, optional
         If True, only keys from all levels of the dictionary are loaded
         with values. Defaults to False.
+    table_format : {'records', 'columns'}, optional
+        Format of values stored as tables. 'records' returns the original
+        list or tuple of dictionaries, 'columns' returns a dictionary of
+        arrays, one per key of the records. Defaults to 'records'.
+    num_threads : int, optional
+        Number of threads used to decompress gzip compressed datasets.
+        If larger than 1, chunks are read directly from the hdf5 file and
+        decompressed in parallel. Defaults to 1.
+    swmr : bool, optional
+        If True, the file is opened in single-writer/multiple-reader mode,
+        which allows reading a file while it is written by a SWMRWriter.
+        Defaults to False.
+    dask_threshold : int, optional
+        If not None, numeric numpy arrays with a size in bytes of at least
+        dask_threshold are returned as dask arrays, which read the data
+        on demand, chunked along the chunks of the dataset. Requires dask
+        (see https://dask.org). Ignored for file-like objects, which
+        cannot be reopened after loading. Defaults to None.
+    out : dict, optional
+        Preallocated numpy arrays keyed by the paths of datasets in the
+        hdf5 file, e.g. {'a/a1': np.empty(3)}. Numpy arrays and quantities
+        stored at these paths are read directly into the given arrays,
+        which are returned in place of newly allocated ones. Shapes have to
+        match the stored arrays. Defaults to None.
+    raw : bool, optional
+        If True, values are not cast to their original types but returned
+        as numpy arrays as stored in the hdf5 file, with strings decoded
+        to unicode. The original type is available as attribute value_type
+        of the returned RawArray objects, the unit of quantities as unit.
+        Lists with unequal dimensions are returned as lists of RawArrays,
+        tables as dictionaries of columns. Defaults to False.
 
     Returns
     -------
@@ -140,8 +241,18 @@ def load(filename, path='', lazy=False):
     {u'a': {u'a1': array([1, 2, 3]), u'a3': {u'a31': 'Test'}, u'a2': 4.0}, u'b': 'string'}
 
     """
+    if table_format not in ('records', 'columns'):
+        raise ValueError("Unsupported table format: "
+                         "{table_format}.".format(table_format=table_format))
+    if _is_file_object(filename):
+        _require_h5py((2, 9), 'file-like objects')
+    if out is not None:
+        out = {key.strip('/'): value for key, value in out.items()}
     try:
-        f = h5py.File(filename, 'r')
+        if swmr:
+            f = h5py.File(filename, 'r', libver='latest', swmr=True)
+        else:
+            f = h5py.File(filename, 'r')
     except IOError:
         raise IOError("unable to open {filename} (File accessability: "
                       "Unable to open file)".format(filename=filename))
@@ -156,54 +267,455 @@ def load(filename, path='', lazy=False):
                     raise KeyError("unable to open {filename}/{path} "
                                    "(Key accessability: Unable to access "
                                    "key)".format(filename=filename, path=path))
-            _, d = _dict_from_h5(obj, lazy=lazy)
+            _, d = _dict_from_h5(obj, lazy=lazy, table_format=table_format,
+                                 num_threads=num_threads,
+                                 dask_threshold=dask_threshold, out=out,
+                                 raw=raw)
         finally:
             f.close()
     return d
 
+
+def dumps(d, **kwargs):
+    """
+    Stores a dictionary in an hdf5 file in memory.
+
+    Parameters
+    ----------
+    d : dict
+        The dictionary to be stored.
+    **kwargs
+        Keyword arguments passed to save, e.g. compression. The file is
+        always created from scratch, so write_mode is ignored.
+
+    Returns
+    -------
+    data : bytes
+        Contents of the hdf5 file.
+
+    Examples
+    --------
+    >>> import h5py_wrapper as h5w
+    >>> data = h5w.dumps({'a': [1, 2, 3]})
+    >>> h5w.loads(data)
+    {'a': [1, 2, 3]}
+    """
+    kwargs.pop('write_mode', None)
+    buf = io.BytesIO()
+    save(buf, d, write_mode='w', **kwargs)
+    return buf.getvalue()
+
+
+def loads(data, **kwargs):
+    """
+    Loads a dictionary from the contents of an hdf5 file.
+
+    Parameters
+    ----------
+    data : bytes
+        Contents of the hdf5 file, e.g. as returned by dumps.
+    **kwargs
+        Keyword arguments passed to load, e.g. path.
+
+    Returns
+    -------
+    dictionary : dict
+        Dictionary from the hdf5 file.
+    """
+    return load(io.BytesIO(data), **kwargs)
+
+
+def iterload(filename, path, num_threads=1, readahead=1):
+    """
+    Iterates over blocks of a dataset in an hdf5 file along its first axis.
+
+    Parameters
+    ----------
+    filename : string
+        The file name of the hdf5 file.
+    path : string
+        Path of the dataset in the hdf5 file.
+    num_threads : int, optional
+        Number of threads used to decompress gzip compressed datasets.
+        Defaults to 1.
+    readahead : int, optional
+        Number of blocks of gzip compressed datasets that are read and
+        decompressed in the background while the current block is
+        processed. Defaults to 1.
+
+    Returns
+    -------
+    blocks : generator
+        Generator of numpy arrays, each spanning one chunk of the dataset
+        along its first axis. Values are not cast to their original types.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> import h5py_wrapper as h5w
+    >>> h5w.save('example_iterload.h5', {'a': np.ones((10000, 100))},
+    ...          compression='gzip', overwrite_dataset=True)
+    >>> total = sum(block.sum() for block in
+    ...             h5w.iterload('example_iterload.h5', 'a', num_threads=4))
+    """
+    if _is_file_object(filename):
+        _require_h5py((2, 9), 'file-like objects')
+    try:
+        f = h5py.File(filename, 'r')
+    except IOError:
+        raise IOError("unable to open {filename} (File accessability: "
+                      "Unable to open file)".format(filename=filename))
+    try:
+        try:
+            obj = f[path]
+        except KeyError:
+            raise KeyError("unable to open {filename}/{path} "
+                           "(Key accessability: Unable to access "
+                           "key)".format(filename=filename, path=path))
+        if (not isinstance(obj, h5py.Dataset) or
+                _resolve_dataset(obj).ndim == 0):
+            raise ValueError("{path} can not be iterated over. Only arrays "
+                             "are supported.".format(path=path))
+        dataset = _resolve_dataset(obj)
+        for block in chunks.iter_blocks(dataset, num_threads=num_threads,
+                                        readahead=readahead):
+            yield block
+    finally:
+        f.close()
+
 # ______________________________________________________________________________
 # Auxiliary functions
 
 
-def _dict_to_h5(f, d, overwrite_dataset, compression=None, parent_group=None):
+def _require_h5py(version, feature):
+    """
+    Raises an ImportError if the version of h5py is older than the
+    (major, minor) tuple version required for feature.
+    """
+    if (h5py_version.major, h5py_version.minor) < version:
+        raise ImportError("Using h5py version {version}. Version must be "
+                          ">= {required} for {feature}.".format(
+                              version=h5py.version.version,
+                              required='.'.join(str(v) for v in version),
+                              feature=feature))
+
+
+def _is_file_object(filename):
+    """
+    Checks whether filename is a file-like object rather than a file name.
+    """
+    return hasattr(filename, 'read')
+
+
+def _save_to_file(f, d, overwrite_dataset, path=None, compression=None,
+                  dedup=False, incremental=False, prune=False, num_threads=1,
+                  precision=None):
+    """
+    Stores the dictionary d under path in the open hdf5 file f.
+    """
+    if path:
+        base = f.require_group(path)
+        _dict_to_h5(f, d, overwrite_dataset, parent_group=base,
+                    compression=compression, dedup=dedup,
+                    incremental=incremental, prune=prune,
+                    num_threads=num_threads, precision=precision)
+    else:
+        _dict_to_h5(f, d, overwrite_dataset, compression=compression,
+                    dedup=dedup, incremental=incremental, prune=prune,
+                    num_threads=num_threads, precision=precision)
+    if overwrite_dataset or incremental or prune:
+        # references to deduplicated data may have been deleted
+        _prune_dedup_pool(f)
+
+
+def _open_buffered(filename, write_mode):
+    """
+    Opens an in-memory hdf5 file, initialized with the contents of
+    filename if write_mode requires it. The file on disk is not modified.
+    """
+    exists = os.path.exists(filename)
+    if exists and write_mode in ('w-', 'x'):
+        raise IOError("File {filename} already exists.".format(
+            filename=filename))
+    if not exists and write_mode == 'r+':
+        raise IOError("File {filename} does not exist.".format(
+            filename=filename))
+    mode = 'r+' if exists and write_mode in ('a', 'r+') else 'w'
+    return h5py.File(filename, mode, driver='core', backing_store=False)
+
+
+def _write_buffered(f, filename):
+    """
+    Closes the in-memory hdf5 file f and writes its contents to filename
+    in a single write. The contents are written to a temporary file next
+    to filename first, which is synced to disk and then replaces filename,
+    so filename holds either the old or the new contents after a crash.
+    """
+    try:
+        f.flush()
+        image = f.id.get_file_image()
+    finally:
+        f.close()
+    tmpname = '{filename}.{id}.tmp'.format(filename=filename,
+                                           id=uuid.uuid4().hex)
+    try:
+        with open(tmpname, 'wb') as tmp:
+            tmp.write(image)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        if os.path.exists(filename):
+            shutil.copymode(filename, tmpname)
+        getattr(os, 'replace', os.rename)(tmpname, filename)
+    except Exception:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+    _fsync_directory(os.path.dirname(os.path.abspath(filename)))
+
+
+def _fsync_directory(dirname):
+    """
+    Syncs the directory dirname to disk, persisting renames of its files.
+    Not supported on all platforms, e.g. Windows, where it is skipped.
+    """
+    try:
+        fd = os.open(dirname, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _dict_to_h5(f, d, overwrite_dataset, compression=None, parent_group=None,
+                dedup=False, incremental=False, prune=False, num_threads=1,
+                extendable=False, precision=None):
     """
     Recursively adds the dictionary to the hdf5 file f.
+    If extendable is True, arrays are stored in datasets that can be
+    extended along their first axis.
+    precision defines the precision policies of float arrays, see save.
     """
     if parent_group is None:
         parent_group = f.parent
+    shared_unit = _shared_unit(d)
+    if shared_unit is not None and '_unit' not in parent_group.attrs:
+        # store the unit of quantities only once per group
+        parent_group.attrs['_unit'] = shared_unit
     for key, value in d.items():
         if isinstance(value, collections.MutableMapping):
-            group_name = os.path.join(parent_group.name, str(key))
-            group = f.require_group(group_name)
+            target_group = parent_group
+            if incremental and not _is_dict_group(parent_group, key):
+                # a value stored previously is replaced by a dictionary
+                target_group = _delete_member(parent_group, key)
+            group = target_group.require_group(str(key))
             _dict_to_h5(f, value, overwrite_dataset, parent_group=group,
-                        compression=compression)
+                        compression=compression, dedup=dedup,
+                        incremental=incremental, prune=prune,
+                        num_threads=num_threads, extendable=extendable,
+                        precision=precision)
 
             # explicitly store type of key
             group.attrs['_key_type'] = type(key).__name__
         else:
+            if incremental:
+                content_hash = _content_hash(
+                    value, precision=precision,
+                    path=os.path.join(parent_group.name, str(key)))
             if str(key) not in parent_group:
                 _create_dataset(parent_group, key, value,
-                                compression=compression)
+                                compression=compression, dedup=dedup,
+                                num_threads=num_threads, extendable=extendable,
+                                precision=precision)
+            elif incremental:
+                if not _is_unchanged(parent_group[str(key)], key,
+                                     content_hash):
+                    target_group = _delete_member(parent_group, key)
+                    _create_dataset(target_group, key, value,
+                                    compression=compression, dedup=dedup,
+                                    num_threads=num_threads,
+                                    extendable=extendable, precision=precision)
             else:
                 if overwrite_dataset is True:
-                    del parent_group[str(key)]
-                    _create_dataset(parent_group, key, value,
-                                    compression=compression)
+                    target_group = _delete_member(parent_group, key)
+                    _create_dataset(target_group, key, value,
+                                    compression=compression, dedup=dedup,
+                                    num_threads=num_threads,
+                                    extendable=extendable, precision=precision)
                 else:
                     raise KeyError("Dataset {key} already "
                                    "exists.".format(key=os.path.join(
                                        parent_group.name, key)))
+            if incremental and content_hash is not None:
+                parent_group[str(key)].attrs['_hash'] = content_hash
+    if prune:
+        keys = set(str(key) for key in d.keys())
+        for name in list(parent_group.keys()):
+            if (name not in keys and
+                    parent_group[name].name != DEDUP_POOL):
+                if _delete_member(parent_group, name) is not parent_group:
+                    del parent_group[name]  # external link to deleted object
 
 
-def _create_dataset(parent_group, key, value, compression=None):
+def _delete_member(parent_group, key):
+    """
+    Deletes the member key of parent_group and returns the group in which
+    a new value for key has to be stored. If the member is an external
+    link, e.g. to a shard of a file written by save_sharded, the linked
+    object is deleted instead, the link is kept and the group containing
+    the linked object is returned.
+    """
+    name = str(key)
+    link = parent_group.get(name, getlink=True)
+    if not isinstance(link, h5py.ExternalLink):
+        del parent_group[name]
+        return parent_group
+    target = parent_group[name]
+    target_group = target.parent
+    if posixpath.basename(target.name) != name:
+        raise ValueError("Dataset {key} links to {target} in {filename} and "
+                         "can not be replaced.".format(
+                             key=os.path.join(parent_group.name, name),
+                             target=target.name,
+                             filename=target.file.filename))
+    del target_group[name]
+    return target_group
+
+
+def _imported_quantities():
+    """
+    Returns the quantities module if it has already been imported,
+    otherwise None. Values can only be quantities if the module has been
+    imported, so there is no need to import it while saving.
+    """
+    return sys.modules.get('quantities')
+
+
+def _import_quantities():
+    """
+    Imports quantities on first use, since importing its unit registry
+    is slow.
+    """
+    try:
+        import quantities as pq
+    except ImportError:
+        raise ImportError("Could not find quantities package, "
+                          "please install the package and "
+                          "reload the wrapper.")
+    return pq
+
+
+def _is_quantity(value):
+    """
+    Checks whether value is a quantities.Quantity.
+    """
+    pq = _imported_quantities()
+    return pq is not None and isinstance(value, pq.Quantity)
+
+
+def _shared_unit(d):
+    """
+    Returns the most common unit of the quantities in d if it is shared
+    by at least two quantities, otherwise None.
+    """
+    pq = _imported_quantities()
+    if pq is None:
+        return None
+    units = collections.Counter(value.dimensionality.string
+                                for value in d.values()
+                                if isinstance(value, pq.Quantity))
+    if len(units) > 0:
+        unit, count = units.most_common(1)[0]
+        if count > 1:
+            return unit
+    return None
+
+
+def _is_dict_group(parent_group, key):
+    """
+    Checks whether key is missing in parent_group or refers to a group
+    storing a dictionary.
+    """
+    if str(key) not in parent_group:
+        return True
+    obj = parent_group[str(key)]
+    return (isinstance(obj, h5py.Group) and
+            _get_str_attr(obj, '_layout') is None)
+
+
+def _is_unchanged(obj, key, content_hash):
+    """
+    Checks whether the dataset or table obj has been stored with the
+    same key type and content hash.
+    """
+    return (content_hash is not None and
+            _get_str_attr(obj, '_hash') == content_hash and
+            _get_str_attr(obj, '_key_type') == type(key).__name__)
+
+
+def _content_hash(value, precision=None, path=''):
+    """
+    Returns a hex digest identifying type, shape and contents of value
+    and the precision policy applying to it at path in the hdf5 file,
+    or None for streams, which cannot be hashed without consuming them.
+    """
+    if _is_stream(value):
+        return None
+    h = hashlib.sha1(type(value).__name__.encode('utf-8'))
+    if value is None:
+        pass
+    elif _is_table(value):
+        for column_key in sorted(value[0].keys(), key=str):
+            # hash columns as stored, including units of quantities
+            column = _table_column(value, column_key)
+            h.update(str(column_key).encode('utf-8'))
+            h.update(_content_hash(
+                column, precision=precision,
+                path=os.path.join(path, str(column_key))).encode('utf-8'))
+    else:
+        if hasattr(value, 'dimensionality'):
+            h.update(value.dimensionality.string.encode('utf-8'))
+        array = np.asarray(value)
+        if array.dtype.kind == 'O':
+            for item in value:
+                h.update(_content_hash(item).encode('utf-8'))
+        else:
+            h.update(lib.hash_array(array).encode('utf-8'))
+        policy = _get_policy(precision, path)
+        if policy is not None and (array.dtype.kind in 'fO' and
+                                   array.ndim > 0):
+            h.update('precision{}'.format(_policy_key(policy)).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _create_dataset(parent_group, key, value, compression=None, dedup=False,
+                    num_threads=1, extendable=False, precision=None):
     """
     Creates the dataset in parent_group.
     """
-    if value is None:  # h5py cannot store NoneType.
+    if _is_table(value):
+        _create_table(parent_group, key, value, compression=compression,
+                      dedup=dedup, num_threads=num_threads,
+                      precision=precision)
+        return
+    original_dtype = None
+    value_type = type(value).__name__
+    if _is_stream(value):
+        dataset, original_dtype = _create_streamed_dataset(
+            parent_group, key, value, compression=compression,
+            policy=_get_policy(precision, os.path.join(parent_group.name,
+                                                       str(key))))
+        value_type = 'ndarray'
+    elif value is None:  # h5py cannot store NoneType.
         dataset = parent_group.create_dataset(
             str(key), data='None', compression=compression)
     elif isinstance(value, (list, np.ndarray, tuple)):
-        if np.array(value).dtype.name == 'object':
+        # numpy arrays are used in place, other iterables converted once
+        data = lib.convert_iterable_to_numpy_array(value)
+        if data.dtype.name == 'object':
             # We store 2d arrays with unequal dimensions by reducing
             # it to a 1d array and additionally storing the original shape.
             # This does not work for more than two dimensions.
@@ -215,17 +727,37 @@ def _create_dataset(parent_group, key, value, compression=None):
                 oldshape = np.array([len(x) for x in value])
                 value_types = lib.convert_iterable_to_numpy_array([type(x).__name__ for x in value])
                 data_reshaped = np.hstack(value)
-                dataset = parent_group.create_dataset(
-                    str(key), data=data_reshaped, compression=compression)
+                data_reshaped, scaleoffset, original_dtype = _apply_precision(
+                    data_reshaped, _get_policy(
+                        precision, os.path.join(parent_group.name, str(key))))
+                dataset = _create_array_dataset(
+                    parent_group, key, data_reshaped, compression=compression,
+                    dedup=dedup, num_threads=num_threads,
+                    scaleoffset=scaleoffset)
                 dataset.attrs['oldshape'] = oldshape
                 dataset.attrs['custom_shape'] = True
                 dataset.attrs['custom_value_types'] = value_types
-        elif quantities_found and isinstance(value, pq.Quantity):
-            dataset = parent_group.create_dataset(str(key), data=value)
-            dataset.attrs['_unit'] = value.dimensionality.string
+        elif _is_quantity(value):
+            data, scaleoffset, original_dtype = _apply_precision(
+                data, _get_policy(precision, os.path.join(parent_group.name,
+                                                          str(key))))
+            dataset = _create_array_dataset(parent_group, key, data,
+                                            compression=compression,
+                                            dedup=dedup,
+                                            num_threads=num_threads,
+                                            extendable=extendable,
+                                            scaleoffset=scaleoffset)
+            unit = value.dimensionality.string
+            if _get_str_attr(parent_group, '_unit') != unit:
+                dataset.attrs['_unit'] = unit
         else:
-            dataset = parent_group.create_dataset(
-                str(key), data=lib.convert_iterable_to_numpy_array(value), compression=compression)
+            data, scaleoffset, original_dtype = _apply_precision(
+                data, _get_policy(precision, os.path.join(parent_group.name,
+                                                          str(key))))
+            dataset = _create_array_dataset(
+                parent_group, key, data, compression=compression, dedup=dedup,
+                num_threads=num_threads, extendable=extendable,
+                scaleoffset=scaleoffset)
     # ignore compression argument for scalar datasets
     elif not isinstance(value, collections.Iterable):
         dataset = parent_group.create_dataset(str(key), data=value)
@@ -235,29 +767,401 @@ def _create_dataset(parent_group, key, value, compression=None):
 
     # explicitly store type of key and value
     dataset.attrs['_key_type'] = type(key).__name__
-    dataset.attrs['_value_type'] = type(value).__name__
+    dataset.attrs['_value_type'] = value_type
+    if original_dtype is not None:  # array has been downcast
+        dataset.attrs['_dtype'] = original_dtype.str
 
 
-def _dict_from_h5(f, lazy=False):
+def _get_policy(precision, path):
+    """
+    Returns the precision policy for the dataset at path, or None.
+    """
+    if isinstance(precision, Mapping):
+        for pattern, policy in precision.items():
+            if fnmatch.fnmatchcase(path.strip('/'), pattern.strip('/')):
+                return policy
+        return None
+    return precision
+
+
+def _policy_key(policy):
+    """
+    Returns a string identifying the precision policy, such that
+    equivalent policies, e.g. 'float32' and np.float32, are identical.
+    """
+    if isinstance(policy, int) and not isinstance(policy, bool):
+        return 'scaleoffset{}'.format(policy)
+    try:
+        return np.dtype(policy).str
+    except TypeError:
+        return str(policy)
+
+
+def _apply_precision(data, policy):
+    """
+    Applies the precision policy to the array data. Returns the array to
+    be stored, the number of decimal digits for the scale-offset filter
+    or None, and the original data type if the array has been downcast,
+    otherwise None. Only float arrays are affected.
+    """
+    if policy is None or data.dtype.kind != 'f' or data.ndim == 0:
+        return data, None, None
+    if isinstance(policy, int) and not isinstance(policy, bool):
+        return data, policy, None
+    try:
+        dtype = np.dtype(policy)
+    except TypeError:
+        dtype = None
+    if dtype is None or dtype.kind != 'f':
+        raise ValueError("Unsupported precision policy: "
+                         "{policy}.".format(policy=policy))
+    if dtype == data.dtype:
+        return data, None, None
+    return data.astype(dtype), None, data.dtype
+
+
+class BlockStream(object):
+    """
+    Blocks of an array, e.g. from a generator, which are written one by
+    one to an extendable dataset by save, so the complete array never
+    has to be held in memory. Loaded as numpy array.
+
+    Plain iterators and generators passed as values to save are handled
+    as streams as well, inferring the data type from the first block.
+
+    Parameters
+    ----------
+    blocks : iterable
+        Numeric numpy arrays or array-likes forming consecutive parts of
+        the array along its first axis. Scalars are handled as blocks of
+        length one.
+    dtype : numpy.dtype, optional
+        Data type of the array. Defaults to the data type of the first
+        block.
+    length : int, optional
+        Total length of the array along its first axis, if known in
+        advance. Used to allocate the dataset at once. Defaults to None.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> import h5py_wrapper as h5w
+    >>> blocks = (np.random.rand(1000, 3) for i in range(100))
+    >>> h5w.save('example_stream.h5',
+    ...          {'a': h5w.BlockStream(blocks, length=100000)},
+    ...          overwrite_dataset=True)
+    """
+
+    def __init__(self, blocks, dtype=None, length=None):
+        self.blocks = blocks
+        self.dtype = dtype
+        self.length = length
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+
+def _is_stream(value):
+    """
+    Checks whether value is a stream of array blocks.
+    """
+    return isinstance(value, (BlockStream, Iterator))
+
+
+def _create_streamed_dataset(parent_group, key, value, compression=None,
+                             policy=None):
+    """
+    Creates an extendable dataset in parent_group and writes the blocks
+    of the stream value to it one by one, applying the precision policy.
+    Returns the dataset and the original data type if the blocks have
+    been downcast, otherwise None.
+    """
+    if isinstance(value, BlockStream):
+        dtype, length = value.dtype, value.length
+    else:
+        dtype, length = None, None
+
+    def create(shape, dtype):
+        stored, scaleoffset, original_dtype = _apply_precision(
+            np.empty((0,), dtype=dtype), policy)
+        dataset = parent_group.create_dataset(
+            str(key), shape=shape, maxshape=(None,) + shape[1:], chunks=True,
+            dtype=stored.dtype, compression=compression,
+            scaleoffset=scaleoffset)
+        return dataset, original_dtype
+
+    dataset = None
+    original_dtype = None
+    n = 0
+    for block in value:
+        block = np.asarray(block)
+        if block.ndim == 0:
+            block = block[np.newaxis]
+        if block.dtype.kind not in 'biufc':
+            raise ValueError("Dataset {key} can not be streamed. Only numeric "
+                             "blocks are supported.".format(
+                                 key=os.path.join(parent_group.name, str(key))))
+        if dataset is None:
+            dataset, original_dtype = create(
+                (length or 0,) + block.shape[1:],
+                block.dtype if dtype is None else dtype)
+        if n + len(block) > dataset.shape[0]:
+            dataset.resize(n + len(block), axis=0)
+        dataset[n:n + len(block)] = block
+        n += len(block)
+    if dataset is None:  # empty stream
+        dataset, original_dtype = create(
+            (0,), np.float64 if dtype is None else dtype)
+    elif n < dataset.shape[0]:
+        dataset.resize(n, axis=0)
+    return dataset, original_dtype
+
+
+def _create_array_dataset(parent_group, key, data, compression=None,
+                          dedup=False, num_threads=1, extendable=False,
+                          scaleoffset=None):
+    """
+    Creates a dataset containing the array data in parent_group.
+    If dedup is True, data is stored only once in the pool group of the
+    file, identified by its content hash, and the dataset in parent_group
+    holds a reference to it.
+    If extendable is True, the dataset is chunked and can be resized along
+    its first axis. Extendable datasets are never deduplicated.
+    If scaleoffset is not None, the scale-offset filter is applied.
+    """
+    if np.ndim(data) == 0:  # scalar datasets do not support compression
+        compression = None
+        scaleoffset = None
+    elif extendable:
+        return parent_group.create_dataset(
+            str(key), data=data, compression=compression, chunks=True,
+            maxshape=(None,) + np.shape(data)[1:], scaleoffset=scaleoffset)
+    if not dedup:
+        return _write_array(parent_group, str(key), data,
+                            compression=compression, num_threads=num_threads,
+                            scaleoffset=scaleoffset)
+    pool = parent_group.file.require_group(DEDUP_POOL)
+    digest = lib.hash_array(data)
+    if scaleoffset is not None:  # lossy copies must not match the original
+        digest += '_scaleoffset{}'.format(scaleoffset)
+    if digest not in pool:
+        _write_array(pool, digest, data, compression=compression,
+                     num_threads=num_threads, scaleoffset=scaleoffset)
+    return parent_group.create_dataset(
+        str(key), data=pool[digest].ref,
+        dtype=h5py.special_dtype(ref=h5py.Reference))
+
+
+def _prune_dedup_pool(f):
+    """
+    Deletes the data in the pool group of the hdf5 file f which is not
+    referenced by any dataset.
+    """
+    if DEDUP_POOL not in f:
+        return
+    referenced = set()
+
+    def visit(name, obj):
+        if isinstance(obj, h5py.Dataset) and _is_reference(obj):
+            referenced.add(f[obj[()]].name)
+
+    f.visititems(visit)
+    pool = f[DEDUP_POOL]
+    for name in list(pool.keys()):
+        if pool[name].name not in referenced:
+            del pool[name]
+
+
+def _write_array(group, name, data, compression=None, num_threads=1,
+                 scaleoffset=None):
+    """
+    Writes the array data to a new dataset name in group. Compresses
+    chunks in parallel if num_threads is larger than 1 and only gzip
+    compression is used.
+    """
+    if (num_threads > 1 and scaleoffset is None and
+            chunks.supports_parallel_write(data, compression)):
+        return chunks.create_compressed_dataset(group, name, data,
+                                                compression, num_threads)
+    return group.create_dataset(name, data=data, compression=compression,
+                                scaleoffset=scaleoffset)
+
+
+def _is_table(value):
+    """
+    Checks whether value is a non-empty list or tuple of dictionaries
+    with identical keys and homogeneous value types per key.
+    """
+    if not isinstance(value, (list, tuple)) or len(value) == 0:
+        return False
+    if not all(isinstance(record, Mapping) for record in value):
+        return False
+    keys = set(value[0].keys())
+    if len(keys) == 0:
+        return False
+    for record in value:
+        if set(record.keys()) != keys:
+            return False
+    for key in keys:
+        column_types = set(type(record[key]) for record in value)
+        if len(column_types) > 1:
+            return False
+        if issubclass(column_types.pop(), (Mapping, type(None))):
+            return False
+    return True
+
+
+def _create_table(parent_group, key, value, compression=None, dedup=False,
+                  num_threads=1, precision=None):
+    """
+    Stores a list or tuple of homogeneous records column-wise in a
+    group of parent_group, creating one dataset per key of the records.
+    """
+    group = parent_group.create_group(str(key))
+    for column_key in value[0].keys():
+        element_type = type(value[0][column_key]).__name__
+        column = _table_column(value, column_key)
+        _create_dataset(group, column_key, column, compression=compression,
+                        dedup=dedup, num_threads=num_threads,
+                        precision=precision)
+        group[str(column_key)].attrs['_element_type'] = element_type
+
+    # explicitly store type of key and value and mark group as table
+    group.attrs['_key_type'] = type(key).__name__
+    group.attrs['_value_type'] = type(value).__name__
+    group.attrs['_layout'] = 'table'
+
+
+def _table_column(value, column_key):
+    """
+    Returns the column column_key of the table value as a list, or as a
+    quantity array in the unit of the first record for quantities.
+    """
+    column = [record[column_key] for record in value]
+    if _is_quantity(column[0]):
+        units = column[0].units
+        column = np.array([element.rescale(units).magnitude
+                           for element in column]) * units
+    return column
+
+
+def _dict_from_h5(f, lazy=False, table_format='records', num_threads=1,
+                  dask_threshold=None, out=None, raw=False):
     """
     Recursively loads the dictionary from the hdf5 file f.
     Converts all datasets to numpy types.
     """
     name = _evaluate_key(f)
     if h5py.h5i.get_type(f.id) == 5:  # check if f is a dataset
-        return name, _load_dataset(f, lazy)
+        return name, _load_dataset(f, lazy, num_threads=num_threads,
+                                   dask_threshold=dask_threshold, out=out,
+                                   raw=raw)
+    elif _get_str_attr(f, '_layout') == 'table':
+        return name, _load_table(f, lazy, table_format=table_format,
+                                 num_threads=num_threads, raw=raw)
+    elif _get_str_attr(f, '_layout') == 'external':
+        return name, _load_external(f, lazy, table_format=table_format,
+                                    num_threads=num_threads,
+                                    dask_threshold=dask_threshold, raw=raw)
     else:
         d = {}
-        for obj in f.values():
-            sub_name, sub_d = _dict_from_h5(obj, lazy=lazy)
+        for obj in _iter_members(f):
+            if obj.name == DEDUP_POOL:
+                continue
+            sub_name, sub_d = _dict_from_h5(obj, lazy=lazy,
+                                            table_format=table_format,
+                                            num_threads=num_threads,
+                                            dask_threshold=dask_threshold,
+                                            out=out, raw=raw)
             d[sub_name] = sub_d
         return name, d
 
 
-def _load_dataset(f, lazy=False):
+def _iter_members(group):
+    """
+    Iterates over the members of group. The names of the members are
+    collected first, since iterating over the members of a group holds
+    the global lock of h5py, which would deadlock with threads
+    decompressing chunks whenever they free h5py objects.
+    """
+    for name in list(group.keys()):
+        yield group[name]
+
+
+def _load_table(f, lazy=False, table_format='records', num_threads=1,
+                raw=False):
+    """
+    Loads a table stored in group f either as a list or tuple of
+    records or as a dictionary of column arrays.
+    If lazy is True, it returns None as value.
+    If raw is True, it returns the dictionary of raw column arrays.
+    """
+    if lazy:
+        return None
+    if raw:
+        return {_evaluate_key(dataset): _load_dataset(
+            dataset, num_threads=num_threads, raw=True)
+            for dataset in _iter_members(f)}
+    columns = {}
+    element_types = {}
+    for dataset in _iter_members(f):
+        column_key = _evaluate_key(dataset)
+        if (table_format == 'columns' and 'custom_shape' not in dataset.attrs
+                and _get_str_attr(dataset, '_value_type') != 'Quantity'):
+            columns[column_key] = _cast_value_type(
+                _read_dataset(dataset, num_threads=num_threads), 'ndarray')
+        else:
+            columns[column_key] = _load_dataset(dataset,
+                                                num_threads=num_threads)
+        element_types[column_key] = _get_str_attr(dataset, '_element_type')
+    if table_format == 'columns':
+        return columns
+    num_records = len(next(iter(columns.values())))
+    # elements of quantity columns are already quantities with units
+    records = [{column_key: column[i]
+                if element_types[column_key] == 'Quantity'
+                else _cast_value_type(column[i], element_types[column_key])
+                for column_key, column in columns.items()}
+               for i in range(num_records)]
+    return eval(valuetype_dict[_get_str_attr(f, '_value_type')])(records)
+
+
+def _load_external(f, lazy=False, table_format='records', num_threads=1,
+                   dask_threshold=None, raw=False):
+    """
+    Loads the values linked from group f to other files as a list,
+    ordered by the names of the links.
+    If lazy is True, it returns None as value.
+    """
+    if lazy:
+        return None
+    return [_dict_from_h5(f[str(i)], table_format=table_format,
+                          num_threads=num_threads,
+                          dask_threshold=dask_threshold, raw=raw)[1]
+            for i in range(len(f))]
+
+
+def _get_str_attr(f, name):
+    """
+    Returns the string attribute name of f, or None if it does not exist.
+    """
+    value = f.attrs.get(name)
+    if isinstance(value, bytes):
+        value = str(value, 'utf-8')
+    return value
+
+
+def _load_dataset(f, lazy=False, num_threads=1, dask_threshold=None,
+                  out=None, raw=False):
     """
     Loads the dataset of group f and returns its name and value.
     If lazy is True, it returns None as value.
+    If the dataset holds a numeric array of at least dask_threshold
+    bytes, it returns a dask array as value.
+    If out contains an array for the path of the dataset, arrays are
+    read into this array.
+    If raw is True, the value is returned as stored without casting it
+    to its original type.
     """
     if lazy:
         return None
@@ -276,12 +1180,172 @@ def _load_dataset(f, lazy=False):
         else:
             if (len(f.attrs.keys()) > 0 and
                     'custom_shape' in f.attrs):
-                return _load_custom_shape(f)
-            elif '_unit' in f.attrs:
-                return _cast_value_type(f.value, value_type,
-                                        unit=f.attrs['_unit'])
+                return _load_custom_shape(f, num_threads=num_threads, raw=raw)
+            elif (dask_threshold is not None and value_type == 'ndarray' and
+                  f.file.driver != 'fileobj' and
+                  _is_large_array(_resolve_dataset(f), dask_threshold)):
+                # dask arrays reopen the file by name, which is impossible
+                # for file-like objects
+                return _load_dask_array(f)
+            elif raw:
+                unit = _get_unit(f) if value_type == 'Quantity' else None
+                return _raw_array(
+                    _read_dataset(f, num_threads=num_threads,
+                                  out=_get_buffer(f, out)),
+                    value_type, unit=unit)
+            elif value_type == 'Quantity':
+                return _cast_value_type(
+                    _read_dataset(f, num_threads=num_threads,
+                                  out=_get_buffer(f, out)),
+                    value_type, unit=_get_unit(f))
+            elif value_type == 'ndarray':
+                return _cast_value_type(
+                    _read_dataset(f, num_threads=num_threads,
+                                  out=_get_buffer(f, out)),
+                    value_type)
             else:
-                return _cast_value_type(f.value, value_type)
+                return _cast_value_type(
+                    _read_dataset(f, num_threads=num_threads), value_type)
+
+
+def _get_unit(f):
+    """
+    Returns the unit of the quantity stored in dataset f.
+    """
+    unit = _get_str_attr(f, '_unit')
+    if unit is None:  # unit shared by all quantities in group
+        unit = _get_str_attr(f.parent, '_unit')
+    return unit
+
+
+class RawArray(np.ndarray):
+    """
+    Numpy array as stored in the hdf5 file, returned by load if raw is
+    True. The name of the original type of the value is available as
+    value_type, the unit of quantities as unit.
+    """
+
+    def __array_finalize__(self, obj):
+        self.value_type = getattr(obj, 'value_type', None)
+        self.unit = getattr(obj, 'unit', None)
+
+
+def _raw_array(value, value_type, unit=None):
+    """
+    Returns value as RawArray, decoding byte strings to unicode.
+    """
+    value = np.asarray(value)
+    if value.dtype.kind == 'S':
+        value = lib.decode_bytes_array(value)
+    value = value.view(RawArray)
+    value.value_type = value_type
+    value.unit = unit
+    return value
+
+
+def _get_buffer(f, out):
+    """
+    Returns the preallocated array for dataset f from out, or None.
+    """
+    if out is None:
+        return None
+    return out.get(f.name.strip('/'))
+
+
+def _is_large_array(dataset, threshold):
+    """
+    Checks whether dataset is a numeric array of at least threshold bytes.
+    """
+    return (dataset.ndim > 0 and dataset.dtype.kind in 'biufc' and
+            dataset.size * dataset.dtype.itemsize >= threshold)
+
+
+def _load_dask_array(f):
+    """
+    Returns a dask array reading the data of dataset f on demand. Its
+    chunks have the size configured in dask and are aligned to the
+    chunks of the dataset, so every read covers whole hdf5 chunks.
+    """
+    try:
+        import dask.array as da
+    except ImportError:
+        raise ImportError("Could not find dask package, "
+                          "please install the package to load "
+                          "datasets as dask arrays.")
+    dataset = _resolve_dataset(f)
+    proxy = _DatasetProxy(dataset.file.filename, dataset.name,
+                          dataset.shape, dataset.dtype)
+    chunks = da.core.normalize_chunks('auto', dataset.shape,
+                                      dtype=dataset.dtype,
+                                      previous_chunks=dataset.chunks)
+    array = da.from_array(proxy, chunks=chunks, name=False,
+                          meta=np.empty((0,) * dataset.ndim,
+                                        dtype=dataset.dtype))
+    if '_dtype' in f.attrs:  # array has been downcast
+        array = array.astype(np.dtype(_get_str_attr(f, '_dtype')))
+    return array
+
+
+class _DatasetProxy(object):
+    """
+    Array-like read access to a dataset, opening the hdf5 file for every
+    read, so it can be used after the file has been closed by load.
+    """
+
+    def __init__(self, filename, name, shape, dtype):
+        self.filename = filename
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self.ndim = len(shape)
+
+    def __getitem__(self, key):
+        with h5py.File(self.filename, 'r') as f:
+            return f[self.name][key]
+
+
+def _read_dataset(f, num_threads=1, out=None):
+    """
+    Reads the data of dataset f. Decompresses chunks in parallel if
+    num_threads is larger than 1 and the dataset is gzip compressed.
+    If out is given, the data is read into this array without
+    intermediate copies.
+    """
+    dataset = _resolve_dataset(f)
+    if out is None and '_dtype' in f.attrs:
+        # cast downcast arrays back to their original data type on reading
+        out = np.empty(dataset.shape,
+                       dtype=np.dtype(_get_str_attr(f, '_dtype')))
+    if out is not None and out.shape != dataset.shape:
+        raise ValueError("Shape {buf_shape} of preallocated array does not "
+                         "match shape {shape} of dataset "
+                         "{key}.".format(buf_shape=out.shape,
+                                         shape=dataset.shape, key=f.name))
+    if (num_threads > 1 and chunks.supports_parallel_read(dataset) and
+            (out is None or out.dtype == dataset.dtype)):
+        return chunks.read_compressed_dataset(dataset, num_threads, out=out)
+    if out is not None:
+        if dataset.size > 0:
+            dataset.read_direct(out)
+        return out
+    return dataset[()]
+
+
+def _is_reference(f):
+    """
+    Checks whether dataset f holds a reference to deduplicated data.
+    """
+    return h5py.check_dtype(ref=f.dtype) is not None
+
+
+def _resolve_dataset(f):
+    """
+    Returns the dataset holding the data of dataset f, following the
+    reference to the pool group if f has been deduplicated.
+    """
+    if _is_reference(f):
+        return f.file[f[()]]
+    return f
 
 
 def _evaluate_key(f):
@@ -298,13 +1362,18 @@ def _evaluate_key(f):
     return name
 
 
-def _load_custom_shape(f):
+def _load_custom_shape(f, num_threads=1, raw=False):
     """
     Reshape array with unequal dimensions into original shape.
+    If raw is True, the rows are returned as a list of RawArrays.
     """
     data_reshaped = []
-    value = f.value
-    custom_value_types = f.attrs['custom_value_types'].astype(np.unicode_)
+    value = _read_dataset(f, num_threads=num_threads)
+    custom_value_types = lib.decode_bytes_array(f.attrs['custom_value_types'])
+    if raw:
+        return [_raw_array(value[j:j + i], value_type)
+                for (j, i), value_type in zip(
+                    lib.accumulate(f.attrs['oldshape']), custom_value_types)]
     for (j, i), value_type in zip(lib.accumulate(f.attrs['oldshape']),
                                   custom_value_types):
         cast_value = _cast_value_type(value[j:j + i],
@@ -318,17 +1387,16 @@ def _cast_value_type(value, value_type, unit=None):
     Casts value into the correct type defined in attrs.
     """
     if value_type in valuetype_dict:
-        if unit:
-            if quantities_found:
-                value = eval(valuetype_dict[value_type])(value, unit)
-            else:
-                raise ImportError("Could not find quantities package, "
-                                  "please install the package and "
-                                  "reload the wrapper.")
+        if value_type == 'Quantity':
+            pq = _import_quantities()
+            # wrap the loaded array without copying it, like the
+            # constructor of quantities does after copying
+            value = np.asarray(value).view(pq.Quantity)
+            value._dimensionality.update(_get_dimensionality(unit or ''))
         else:
             if value_type in ['list', 'tuple']:
                 if isinstance(value, np.ndarray) and value.dtype.kind == 'S':
-                    value = value.astype(np.unicode_)
+                    value = lib.decode_bytes_array(value)
                 # ensures that all dimensions of the array are converted to the correct value type
                 value = _array_to_type(value, value_type)
             else:
@@ -336,13 +1404,27 @@ def _cast_value_type(value, value_type, unit=None):
                     value = value.decode()
                 value = eval(valuetype_dict[value_type])(value)
                 if isinstance(value, np.ndarray) and value.dtype.kind == 'S':
-                    value = value.astype(np.unicode_)
+                    value = lib.decode_bytes_array(value)
         return value
     else:
         raise NotImplementedError("Unsupported data type: "
                                   "{value_type}.".format(value_type=value_type))
 
 
+def _get_dimensionality(unit):
+    """
+    Returns the dimensionality of the unit string, parsing each unit
+    string only once.
+    """
+    try:
+        return _dimensionality_cache[unit]
+    except KeyError:
+        pq = _import_quantities()
+        dimensionality = pq.Quantity(1., unit).dimensionality
+        _dimensionality_cache[unit] = dimensionality
+        return dimensionality
+
+
 def _array_to_type(value, value_type):
     """
     Casts members of arrays to the specified type recursively.
@@ -352,9 +1434,15 @@ def _array_to_type(value, value_type):
     else:
         return eval(valuetype_dict[value_type])(value)
 
+# Dimensionalities of parsed unit strings
+_dimensionality_cache = {}
+
+# Name of the group holding deduplicated data
+DEDUP_POOL = '/__dedup_pool__'
+
 # Look-up table with supported datatypes
 valuetype_dict = {'tuple': 'tuple',
-                  'ndarray': 'np.array',
+                  'ndarray': 'np.asarray',
                   'list': 'list',
                   'float': 'float',
                   'int': 'int',
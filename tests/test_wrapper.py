@@ -5,16 +5,27 @@ Unit and integration tests for the h5py_wrapper module
 """
 
 from future.builtins import str, range
+import h5py
 import importlib
+import io
 import os
 import numpy as np
 from numpy.testing import assert_array_equal
 import pytest
+import subprocess
 import sys
 
+import h5py_wrapper
 import h5py_wrapper.wrapper as h5w
 import h5py_wrapper.lib as h5w_lib
 
+# check whether dask is available
+try:
+    import dask.array as da
+    dask_found = True
+except ImportError:
+    dask_found = False
+
 # check whether quantities is available
 try:
     import quantities as pq
@@ -22,6 +33,14 @@ try:
 except ImportError:
     quantities_found = False
 
+# check whether file-like objects are supported by h5py
+fileobj_supported = ((h5w.h5py_version.major, h5w.h5py_version.minor) >=
+                     (2, 9))
+
+# check whether virtual datasets are supported by h5py and HDF5
+vds_supported = (hasattr(h5py, 'VirtualLayout') and
+                 h5py.version.hdf5_version_tuple[:2] >= (1, 10))
+
 fn = 'data.h5'
 fn2 = 'data2.h5'
 
@@ -272,6 +291,27 @@ def test_store_and_load_quantities_array():
     assert(res['times'].dimensionality == data['times'].dimensionality)
 
 
+@pytest.mark.skipif(not quantities_found, reason='quantities module not found.')
+def test_store_and_load_quantities_shared_unit_and_compression():
+    data = {'spikes': {'a': np.arange(100.) * pq.ms,
+                       'b': np.arange(10.) * pq.ms,
+                       'c': np.arange(5.) * pq.s,
+                       'd': 2. * pq.ms}}
+    h5w.save(fn, data, write_mode='w', compression='gzip')
+    with h5py.File(fn, 'r') as f:
+        assert(f['spikes'].attrs['_unit'] == 'ms')
+        assert('_unit' not in f['spikes/a'].attrs)
+        assert(f['spikes/c'].attrs['_unit'] == 's')
+        assert(f['spikes/a'].compression == 'gzip')
+    res = h5w.load(fn)
+    for key, value in data['spikes'].items():
+        assert(isinstance(res['spikes'][key], pq.Quantity))
+        assert(res['spikes'][key].dimensionality == value.dimensionality)
+        assert_array_equal(res['spikes'][key].magnitude, value.magnitude)
+    assert(h5w.load(fn, path='spikes/b').dimensionality ==
+           data['spikes']['b'].dimensionality)
+
+
 def test_store_and_load_with_compression():
     data = {'a': 1, 'test1': {'b': 2}, 'test2': {
         'test3': {'c': np.array([1, 2, 3])}}}
@@ -279,6 +319,376 @@ def test_store_and_load_with_compression():
     h5w.load(fn)
 
 
+def test_store_with_parallel_compression():
+    data = {'a': np.random.rand(1000, 37),
+            'b': {'c': np.arange(100003, dtype=np.int32)},
+            'd': np.array([1 + 1j, 2 - 1j]), 'e': 5}
+    h5w.save(fn, data, write_mode='w', compression=9, num_threads=4)
+    with h5py.File(fn, 'r') as f:
+        assert(f['a'].compression == 'gzip')
+        assert(f['a'].compression_opts == 9)
+        assert_array_equal(f['a'][()], data['a'])
+    h5w.save(fn, data, write_mode='w', compression='gzip', num_threads=4)
+    res = h5w.load(fn)
+    assert_array_equal(res['a'], data['a'])
+    assert_array_equal(res['b']['c'], data['b']['c'])
+    assert_array_equal(res['d'], data['d'])
+    assert(res['e'] == data['e'])
+
+
+def test_load_with_parallel_decompression():
+    data = {'a': np.random.rand(1000, 37),
+            'b': {'c': np.arange(100003, dtype=np.int32)}, 'e': 5}
+    h5w.save(fn, data, write_mode='w', compression='gzip')
+    res = h5w.load(fn, num_threads=4)
+    assert_array_equal(res['a'], data['a'])
+    assert_array_equal(res['b']['c'], data['b']['c'])
+    assert(res['e'] == data['e'])
+
+    # partially written datasets contain the fill value
+    with h5py.File(fn2, 'w') as f:
+        dataset = f.create_dataset('a', shape=(100, 3), chunks=(10, 3),
+                                   compression='gzip', fillvalue=-1)
+        dataset[:15] = 1
+        dataset.attrs['_value_type'] = 'ndarray'
+    res = h5w.load(fn2, num_threads=2)
+    assert_array_equal(res['a'][:15], 1)
+    assert_array_equal(res['a'][15:], -1)
+
+
+def test_iterload():
+    a = np.random.rand(1000, 37)
+    for compression in [None, 'gzip']:
+        h5w.save(fn, {'a': a}, write_mode='w', compression=compression)
+        blocks = list(h5w.iterload(fn, 'a', num_threads=3, readahead=2))
+        assert_array_equal(np.concatenate(blocks), a)
+        if compression == 'gzip':
+            assert(len(blocks) > 1)
+
+    h5w.save(fn, {'s': 1.5, 'd': {'e': 1}, 'a': a}, write_mode='w',
+             dedup=True)
+    assert_array_equal(np.concatenate(list(h5w.iterload(fn, 'a'))), a)
+    for path in ['s', 'd']:
+        with pytest.raises(ValueError):
+            list(h5w.iterload(fn, path))
+
+
+def test_swmr_append_and_poll():
+    data = {'rates': np.empty(0), 'positions': {'x': np.empty((0, 2))},
+            'label': 'trial'}
+    with h5py_wrapper.SWMRWriter(fn, data) as writer:
+        with h5py_wrapper.SWMRReader(fn) as reader:
+            assert(len(reader.poll('rates')) == 0)
+            writer.append('rates', [1., 2.])
+            writer.append('positions/x', [3., 4.])
+            writer.flush()
+            assert_array_equal(reader.poll('rates'), [1., 2.])
+            writer.append('rates', np.arange(3.))
+            writer.flush()
+            assert_array_equal(reader.poll('rates'), np.arange(3.))
+            assert_array_equal(reader.poll('positions/x'), [[3., 4.]])
+            res = reader.load()
+            assert_array_equal(res['rates'], [1., 2., 0., 1., 2.])
+            assert(res['label'] == 'trial')
+            assert_array_equal(h5w.load(fn, path='rates', swmr=True),
+                               res['rates'])
+    res = h5w.load(fn)
+    assert(np.shape(res['positions']['x']) == (1, 2))
+
+
+@pytest.mark.skipif(not vds_supported,
+                    reason='virtual datasets require h5py >= 2.9 '
+                           'and HDF5 >= 1.10.')
+def test_merge_virtual(tmpdir):
+    inputs = [os.path.join(str(tmpdir), 'rank{}.h5'.format(rank))
+              for rank in range(3)]
+    output = os.path.join(str(tmpdir), 'merged.h5')
+    for rank, filename in enumerate(inputs):
+        data = {'spikes': np.arange(rank + 2) + 10 * rank,
+                'matrix': np.ones((rank + 1, 3)) * rank,
+                'rank': rank, 'name': 'rank{}'.format(rank),
+                3: {'ragged': np.ones(rank + 1) if rank < 2 else [1, 2]}}
+        h5w.save(filename, data, write_mode='w', dedup=(rank == 1))
+    h5py_wrapper.merge_virtual(output, inputs)
+    res = h5w.load(output)
+    assert_array_equal(res['spikes'], [0, 1, 10, 11, 12, 20, 21, 22, 23])
+    assert(np.shape(res['matrix']) == (6, 3))
+    assert_array_equal(res['matrix'][:, 0], [0, 1, 1, 2, 2, 2])
+    assert(res['rank'] == [0, 1, 2])
+    assert(res['name'] == ['rank0', 'rank1', 'rank2'])
+    assert(isinstance(res[3]['ragged'], list))
+    assert_array_equal(res[3]['ragged'][1], np.ones(2))
+    assert(res[3]['ragged'][2] == [1, 2])
+    with h5py.File(output, 'r') as f:
+        assert(f['spikes'].is_virtual)
+
+
+@pytest.mark.skipif(not dask_found, reason='dask module not found.')
+def test_load_dask_arrays():
+    data = {'large': np.random.rand(1000, 50), 'small': np.arange(10),
+            'd': {'large': np.arange(10000)}, 'i': i0}
+    h5w.save(fn, data, write_mode='w', compression='gzip', dedup=True)
+    res = h5w.load(fn, dask_threshold=1000)
+    assert(isinstance(res['large'], da.Array))
+    assert(isinstance(res['d']['large'], da.Array))
+    assert(isinstance(res['small'], np.ndarray))
+    assert(res['i'] == i0)
+    # small arrays are read at once, large ones in multiples of hdf5 chunks
+    assert(res['large'].numblocks == (1, 1))
+    assert_array_equal(res['large'].compute(), data['large'])
+    assert(res['d']['large'].sum().compute() == data['d']['large'].sum())
+    import dask
+    with dask.config.set({'array.chunk-size': '100kB'}):
+        res = h5w.load(fn, dask_threshold=1000)
+    with h5py.File(fn, 'r') as f:
+        hdf5_chunks = h5w._resolve_dataset(f['large']).chunks
+    assert(res['large'].numblocks[0] > 1)
+    for dask_chunks, hdf5_chunk in zip(res['large'].chunks, hdf5_chunks):
+        assert(all(c % hdf5_chunk == 0 for c in dask_chunks[:-1]))
+    assert_array_equal(res['large'].compute(), data['large'])
+
+
+def test_load_into_preallocated_arrays():
+    data = {'a': np.random.rand(100, 3), 'b': {'c': np.arange(50)},
+            'e': np.arange(4.)}
+    h5w.save(fn, data, write_mode='w', compression='gzip')
+    out = {'a': np.empty((100, 3)), '/b/c': np.empty(50, dtype=np.int64)}
+    for num_threads in [1, 2]:
+        res = h5w.load(fn, out=out, num_threads=num_threads)
+        assert(res['a'] is out['a'])
+        assert(res['b']['c'] is out['/b/c'])
+        assert_array_equal(out['a'], data['a'])
+        assert_array_equal(out['/b/c'], data['b']['c'])
+        assert_array_equal(res['e'], data['e'])
+    with pytest.raises(ValueError):
+        h5w.load(fn, out={'e': np.empty(5)})
+
+
+def test_load_raw():
+    data = {'ll': ll0, 'ls': l0s, 'ln': ln0, 'tt': tt0, 'i': i0, 's': s0,
+            'n': None, 'records': [{'a': 1, 'b': 'x'}, {'a': 2, 'b': 'y'}]}
+    h5w.save(fn, data, write_mode='w')
+    res = h5w.load(fn, raw=True)
+    assert(isinstance(res['ll'], h5py_wrapper.RawArray))
+    assert(res['ll'].value_type == 'list')
+    assert_array_equal(res['ll'], ll0)
+    assert(res['ls'].dtype.kind == 'U')
+    assert_array_equal(res['ls'], l0s)
+    assert(res['tt'].value_type == 'tuple')
+    assert(isinstance(res['ln'], list))
+    assert_array_equal(res['ln'][1], ln0[1])
+    assert(res['i'] == i0 and res['i'].value_type == 'int')
+    assert(res['s'] == s0 and res['s'].value_type == 'str')
+    assert(res['n'] is None)
+    assert_array_equal(res['records']['a'], [1, 2])
+    assert(res['records']['b'].value_type == 'list')
+
+
+@pytest.mark.skipif(not quantities_found, reason='quantities module not found.')
+def test_load_raw_quantities():
+    h5w.save(fn, {'q': np.arange(3.) * pq.mV}, write_mode='w')
+    res = h5w.load(fn, raw=True)
+    assert(not isinstance(res['q'], pq.Quantity))
+    assert(res['q'].value_type == 'Quantity')
+    assert(res['q'].unit == 'mV')
+
+
+@pytest.mark.skipif(sys.version_info[0] < 3,
+                    reason='non-ASCII literals are byte strings in python 2.')
+def test_store_and_load_utf8_strings():
+    data = {'ls': ['ä', 'b', 'ñandú'], 'as': np.array([['α', 'β'], ['γ', 'δ']]),
+            's': 'äöü'}
+    h5w.save(fn, data, write_mode='w')
+    if hasattr(h5py, 'check_string_dtype'):  # h5py >= 2.10
+        with h5py.File(fn, 'r') as f:
+            assert(h5py.check_string_dtype(f['ls'].dtype).encoding == 'utf-8')
+    res = h5w.load(fn)
+    assert(res['ls'] == data['ls'])
+    assert_array_equal(res['as'], data['as'])
+    assert(res['s'] == data['s'])
+
+
+def test_save_peak_memory():
+    tracemalloc = pytest.importorskip('tracemalloc')
+    # arrays are written without intermediate copies
+    a = np.random.rand(1000000)
+    tracemalloc.start()
+    h5w.save(fn, {'a': a}, write_mode='w')
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert(peak < a.nbytes / 2)
+
+    # unicode arrays are only converted to UTF-8 byte strings
+    u = np.array(['string {}'.format(i) for i in range(100000)])
+    tracemalloc.start()
+    h5w.save(fn, {'u': u}, write_mode='w')
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert(peak < u.nbytes / 2)
+
+
+def test_store_streams():
+    blocks = [np.random.rand(n, 3) for n in [100, 1, 250]]
+    data = {'generator': (block for block in blocks),
+            'stream': h5py_wrapper.BlockStream(blocks, dtype=np.float32,
+                                               length=400),
+            'scalars': iter(range(5)),
+            'empty': h5py_wrapper.BlockStream([])}
+    h5w.save(fn, data, write_mode='w', compression='gzip', incremental=True)
+    res = h5w.load(fn)
+    assert_array_equal(res['generator'], np.concatenate(blocks))
+    assert(res['stream'].dtype == np.float32)
+    assert(np.shape(res['stream']) == (351, 3))
+    assert_array_equal(res['scalars'], np.arange(5))
+    assert(np.shape(res['empty']) == (0,))
+
+    with pytest.raises(ValueError):
+        h5w.save(fn, {'s': iter(['a', 'b'])}, write_mode='w')
+
+
+def test_buffered_save(tmpdir):
+    filename = os.path.join(str(tmpdir), 'buffered.h5')
+    h5w.save(filename, {'a': np.arange(10), 'b': {'c': 'd'}},
+             write_mode='w', buffered=True)
+    h5w.save(filename, {'e': 1.5}, buffered=True)
+    res = h5w.load(filename)
+    assert_array_equal(res['a'], np.arange(10))
+    assert(res['b']['c'] == 'd')
+    assert(res['e'] == 1.5)
+
+    # file is left unchanged if saving fails
+    with pytest.raises(KeyError):
+        h5w.save(filename, {'f': 2, 'e': 3.}, buffered=True)
+    assert('f' not in h5w.load(filename))
+    assert(os.listdir(str(tmpdir)) == ['buffered.h5'])
+
+    with h5py_wrapper.BufferedWriter(filename) as w:
+        for i in range(10):
+            w.save({'g': i}, overwrite_dataset=True)
+        w.save({'h': 'i'}, path='b')
+    res = h5w.load(filename)
+    assert(res['g'] == 9)
+    assert(res['b'] == {'c': 'd', 'h': 'i'})
+    with pytest.raises(KeyError):
+        with h5py_wrapper.BufferedWriter(filename) as w:
+            w.save({'j': 1})
+            w.save({'g': 1})
+    assert('j' not in h5w.load(filename))
+    assert(os.listdir(str(tmpdir)) == ['buffered.h5'])
+
+
+@pytest.mark.skipif(not fileobj_supported,
+                    reason='file-like objects require h5py >= 2.9.')
+def test_file_objects():
+    buf = io.BytesIO()
+    h5w.save(buf, {'a': np.arange(5), 'b': {'c': 'd'}})
+    h5w.save(buf, {'e': 1.5}, resize=True, overwrite_dataset=True)
+    buf.seek(0)
+    res = h5w.load(buf)
+    assert_array_equal(res['a'], np.arange(5))
+    assert(res['b']['c'] == 'd')
+    assert(res['e'] == 1.5)
+
+    data = h5py_wrapper.dumps(res, buffered=True, write_mode='a')
+    assert(isinstance(data, bytes))
+    res2 = h5py_wrapper.loads(data, path='b')
+    assert(res2 == {'c': 'd'})
+
+    # datasets of file-like objects are never loaded as dask arrays
+    res3 = h5py_wrapper.loads(data, dask_threshold=0)
+    assert(isinstance(res3['a'], np.ndarray))
+    assert_array_equal(res3['a'], np.arange(5))
+
+
+def test_save_sharded(tmpdir):
+    filename = os.path.join(str(tmpdir), 'sharded.h5')
+    d = {'a': np.arange(1000), 'b': {'c': np.ones(500), 'd': 'e'},
+         'f': np.zeros(800), 1: 2.5}
+    h5py_wrapper.save_sharded(filename, d, num_shards=2, processes=2,
+                              write_mode='w')
+    assert(sorted(os.listdir(str(tmpdir))) ==
+           ['sharded.0.h5', 'sharded.1.h5', 'sharded.h5'])
+    res = h5w.load(filename)
+    assert_array_equal(res['a'], d['a'])
+    assert_array_equal(res['b']['c'], d['b']['c'])
+    assert(res['b']['d'] == 'e')
+    assert(res[1] == 2.5)
+
+    # values are updated in their shard, new values added to new shards
+    h5py_wrapper.save_sharded(filename, {'a': np.arange(3), 'g': np.ones(10)},
+                              shard_size=100, overwrite_dataset=True)
+    h5w.save(filename, {'b': {'d': 'h'}}, overwrite_dataset=True)
+    assert(len(os.listdir(str(tmpdir))) == 4)
+    res = h5w.load(filename)
+    assert_array_equal(res['a'], np.arange(3))
+    assert_array_equal(res['g'], np.ones(10))
+    assert(res['b']['d'] == 'h')
+
+    # top-level values are replaced and pruned in their shard
+    h5w.save(filename, {'a': np.arange(5)}, overwrite_dataset=True)
+    res = h5w.load(filename)
+    res['f'] = np.ones(800)
+    del res[1]
+    h5w.save(filename, res, incremental=True, prune=True)
+    with h5py.File(filename, 'r') as f:
+        assert(isinstance(f.get('a', getlink=True), h5py.ExternalLink))
+        assert(isinstance(f.get('f', getlink=True), h5py.ExternalLink))
+        assert('1' not in f)
+    for shard in ['sharded.0.h5', 'sharded.1.h5']:
+        with h5py.File(os.path.join(str(tmpdir), shard), 'r') as f:
+            assert('1' not in f)
+    res = h5w.load(filename)
+    assert_array_equal(res['a'], np.arange(5))
+    assert_array_equal(res['f'], np.ones(800))
+    assert(1 not in res)
+
+    with pytest.raises(ValueError):
+        h5py_wrapper.save_sharded(filename, d)
+
+
+def test_precision_policies():
+    data = {'v': {'v1': np.random.rand(100), 'v2': np.random.rand(10, 3)},
+            'rates': np.random.rand(1000) * 100.,
+            'exact': np.random.rand(10), 'ints': np.arange(10), 'scalar': 1.5}
+    h5w.save(fn, data, write_mode='w', compression='gzip', num_threads=2,
+             dedup=True, precision={'v/*': 'float16', 'rates': 2})
+    with h5py.File(fn, 'r') as f:
+        assert(h5w._resolve_dataset(f['v/v1']).dtype == np.float16)
+        assert(h5w._resolve_dataset(f['rates']).scaleoffset == 2)
+    res = h5w.load(fn)
+    for key in ['v1', 'v2']:
+        assert(res['v'][key].dtype == np.float64)
+        assert(np.allclose(res['v'][key], data['v'][key], atol=1e-3))
+    assert(np.allclose(res['rates'], data['rates'], atol=0.01))
+    assert_array_equal(res['exact'], data['exact'])
+    assert_array_equal(res['ints'], data['ints'])
+    assert(res['scalar'] == 1.5)
+
+    h5w.save(fn, {'a': [0.5, 0.25]}, write_mode='w', precision='float32')
+    assert(h5w.load(fn)['a'] == [0.5, 0.25])
+
+    # policies apply to streamed and ragged arrays
+    blocks = [np.random.rand(100) for i in range(3)]
+    ragged = [np.random.rand(3), np.random.rand(5)]
+    h5w.save(fn, {'lfp': (block for block in blocks), 'ragged': ragged,
+                  'so': iter(blocks)}, write_mode='w',
+             precision={'lfp': 'float16', 'ragged': 'float32', 'so': 3})
+    with h5py.File(fn, 'r') as f:
+        assert(f['lfp'].dtype == np.float16)
+        assert(f['ragged'].dtype == np.float32)
+        assert(f['so'].scaleoffset == 3)
+    res = h5w.load(fn)
+    assert(res['lfp'].dtype == np.float64)
+    assert(np.allclose(res['lfp'], np.concatenate(blocks), atol=1e-3))
+    assert(np.allclose(res['so'], np.concatenate(blocks), atol=1e-3))
+    for loaded, original in zip(res['ragged'], ragged):
+        assert(loaded.dtype == np.float64)
+        assert(np.allclose(loaded, original, atol=1e-6))
+
+    with pytest.raises(ValueError):
+        h5w.save(fn, data, write_mode='w', precision='int8')
+
+
 def test_store_and_test_key_types():
     data = {'a': 1, (1, 2): {4: 2.}, 4.: 3.}
     h5w.save(fn, data, write_mode='w')
@@ -392,6 +802,139 @@ def test_conversion_script(tmpdir):
         os.remove(tmp_fn2)
 
 
+def test_store_and_load_table():
+    records = [{'trial': i, 'rate': 0.5 * i, 'label': str(i),
+                'spikes': np.arange(3) + i} for i in range(5)]
+    h5w.save(fn, {'records': records}, write_mode='w')
+    res = h5w.load(fn)
+    assert(isinstance(res['records'], list))
+    assert(len(res['records']) == len(records))
+    for record, loaded_record in zip(records, res['records']):
+        assert(loaded_record['trial'] == record['trial'])
+        assert(isinstance(loaded_record['trial'], int))
+        assert(loaded_record['rate'] == record['rate'])
+        assert(loaded_record['label'] == record['label'])
+        assert_array_equal(loaded_record['spikes'], record['spikes'])
+
+    res = h5w.load(fn, table_format='columns')
+    assert_array_equal(res['records']['trial'], np.arange(5))
+    assert_array_equal(res['records']['label'], [str(i) for i in range(5)])
+    assert(np.shape(res['records']['spikes']) == (5, 3))
+    assert_array_equal(h5w.load(fn, path='records/rate'),
+                       [0.5 * i for i in range(5)])
+
+    with pytest.raises(ValueError):
+        h5w.load(fn, table_format='rows')
+
+
+@pytest.mark.skipif(not quantities_found, reason='quantities module not found.')
+def test_store_and_load_table_with_quantities():
+    records = [{'t': 1. * pq.ms, 'i': 0}, {'t': 0.002 * pq.s, 'i': 1}]
+    h5w.save(fn, {'records': records}, write_mode='w')
+    res = h5w.load(fn)
+    for i, record in enumerate(res['records']):
+        assert(isinstance(record['t'], pq.Quantity))
+        assert(record['t'].units == pq.ms)
+        assert(record['t'] == (i + 1) * pq.ms)
+    res = h5w.load(fn, table_format='columns')
+    assert(res['records']['t'].units == pq.ms)
+    assert_array_equal(res['records']['t'].magnitude, [1., 2.])
+
+    # changes of units are detected by incremental saves
+    h5w.save(fn, {'records': records}, write_mode='w', incremental=True)
+    records = [{'t': 1. * pq.s, 'i': 0}, {'t': 2. * pq.s, 'i': 1}]
+    h5w.save(fn, {'records': records}, incremental=True)
+    res = h5w.load(fn)
+    assert(res['records'][1]['t'] == 2. * pq.s)
+    assert(res['records'][1]['t'].units == pq.s)
+
+
+def test_store_and_load_deduplicated_arrays():
+    m = np.random.rand(50, 50)
+    data = {'a': m, 'b': {'c': m.copy(), 'd': np.arange(4)}, 'e': l0i}
+    h5w.save(fn, data, write_mode='w', dedup=True)
+    h5w.save(fn, {'f': m}, dedup=True)
+    with h5py.File(fn, 'r') as f:
+        assert(len(f[h5w.DEDUP_POOL]) == 3)
+    res = h5w.load(fn)
+    assert(set(res.keys()) == {'a', 'b', 'e', 'f'})
+    for value in (res['a'], res['b']['c'], res['f']):
+        assert_array_equal(value, m)
+    assert_array_equal(res['b']['d'], np.arange(4))
+    assert(res['e'] == l0i)
+    assert_array_equal(h5w.load(fn, path='b/c'), m)
+
+    # unreferenced data is removed from the pool
+    for i in range(3):
+        h5w.save(fn, {'a': np.random.rand(100, 100)}, dedup=True,
+                 overwrite_dataset=True)
+    with h5py.File(fn, 'r') as f:
+        assert(len(f[h5w.DEDUP_POOL]) == 4)
+    h5w.save(fn, {'a': m, 'f': np.ones(3)}, dedup=True, incremental=True,
+             prune=True)
+    with h5py.File(fn, 'r') as f:
+        assert(len(f[h5w.DEDUP_POOL]) == 2)
+    assert_array_equal(h5w.load(fn, path='a'), m)
+
+
+def test_incremental_save():
+    data = {'a': np.arange(10), 'b': {'c': 1.5, 'd': l0s}, 'e': 'old'}
+    h5w.save(fn, data, write_mode='w', incremental=True)
+    # mark all datasets to detect which ones are rewritten
+    with h5py.File(fn, 'a') as f:
+        for name in ['a', 'b/c', 'b/d', 'e']:
+            f[name].attrs['marker'] = True
+
+    data['b']['c'] = 2.5
+    data['a'] = np.arange(10)
+    h5w.save(fn, data, incremental=True)
+    with h5py.File(fn, 'r') as f:
+        assert('marker' in f['a'].attrs)
+        assert('marker' not in f['b/c'].attrs)
+        assert('marker' in f['b/d'].attrs)
+        assert('marker' in f['e'].attrs)
+    res = h5w.load(fn)
+    assert(res['b']['c'] == 2.5)
+
+    # changes of type and shape are detected
+    del data['e']
+    data['a'] = np.arange(10.)
+    data['b']['d'] = l0s[:2]
+    h5w.save(fn, data, incremental=True, prune=True)
+    res = h5w.load(fn)
+    assert('e' not in res)
+    assert(res['a'].dtype == np.float64)
+    assert(res['b']['d'] == l0s[:2])
+
+    # 0-d and 1-d arrays with the same element differ
+    h5w.save(fn, {'s': np.array(5)}, incremental=True)
+    h5w.save(fn, {'s': np.array([5])}, incremental=True)
+    assert(np.shape(h5w.load(fn, path='s')) == (1,))
+
+    # changes of the precision policy are detected
+    h5w.save(fn, {'a': data['a']}, incremental=True, precision='float32')
+    with h5py.File(fn, 'r') as f:
+        assert(f['a'].dtype == np.float32)
+    h5w.save(fn, {'a': data['a']}, incremental=True, precision={'b/*': 2})
+    with h5py.File(fn, 'r') as f:
+        assert(f['a'].dtype == np.float64)
+
+
+def test_lazy_import_of_optional_dependencies():
+    # importing the wrapper must not import rarely used dependencies,
+    # which dominate its import time
+    code = ('import sys, time; t = time.time(); import h5py_wrapper; '
+            'print(time.time() - t); '
+            'print(" ".join(m for m in ("quantities", "requests", "tarfile", '
+            '"multiprocessing", "multiprocessing.pool") '
+            'if m in sys.modules))')
+    output = subprocess.check_output([sys.executable, '-c', code],
+                                     cwd=os.path.join(os.path.dirname(__file__), '..'))
+    import_time, imported = (output.decode('utf-8').split('\n') + [''])[:2]
+    print('import time: {} s'.format(import_time))
+    assert(imported.strip() == '')
+
+
 def test_raises_error_for_dictlabel_and_path():
     res = {}
     with pytest.raises(ValueError):